@@ -0,0 +1,80 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Dependencies that must only be imported by the pipeline stages that use them
+HEAVY_MODULES = ("requests", "websocket", "bs4", "PIL", "dotenv")
+
+
+def configure_argparse():
+    """Configure and parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Check script.py startup time against a budget using python -X importtime')
+    parser.add_argument('--runs', type=int, default=5, help='Number of runs per scenario (the median is reported)')
+    parser.add_argument('--library-budget-ms', type=float, default=60,
+                        help='Budget for `import script` from another program')
+    parser.add_argument('--cli-budget-ms', type=float, default=90,
+                        help='Budget for the imports done by `script.py --help`')
+    return parser.parse_args()
+
+
+def import_times(args):
+    """Run python -X importtime with args
+
+    Returns ({top-level module: cumulative microseconds}, {every module imported, at any depth}).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=SCRIPT_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with {result.returncode}: {result.stderr[-500:]}")
+
+    modules = {}
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        imported.add(name.strip())
+        # Nested imports are indented below the module that imported them
+        if not name[1:].startswith(" "):
+            modules[name.strip()] = int(cumulative)
+    return modules, imported
+
+
+def measure(label, args, budget_ms, runs, baseline, forbidden):
+    totals = []
+    for _ in range(runs):
+        modules, imported = import_times(args)
+        totals.append(sum(us for name, us in modules.items() if name not in baseline) / 1000)
+        loaded = [name for name in forbidden if name in imported]
+        if loaded:
+            print(f"FAIL {label}: imported {', '.join(loaded)} at startup")
+            return False
+
+    median = statistics.median(totals)
+    status = "ok" if median <= budget_ms else "FAIL"
+    print(f"{status} {label}: {median:.1f}ms (budget {budget_ms:.0f}ms, runs {', '.join(f'{t:.1f}' for t in totals)})")
+    return median <= budget_ms
+
+
+if __name__ == "__main__":
+    args = configure_argparse()
+
+    baseline = set(import_times(["-c", "pass"])[0])
+    results = [
+        measure("library import", ["-c", "import script"], args.library_budget_ms,
+                args.runs, baseline, HEAVY_MODULES),
+        measure("cli --help", ["script.py", "--help"], args.cli_budget_ms,
+                args.runs, baseline, HEAVY_MODULES),
+    ]
+    sys.exit(0 if all(results) else 1)
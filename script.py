@@ -1,59 +1,892 @@
-import requests
 import json
 import uuid
-import websocket
 import base64
-import ssl
+import socket
 import argparse
+import sys
 import logging
 from datetime import datetime
 import os
+import threading
+import time
+import random
+import hashlib
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+from contextlib import contextmanager, nullcontext
 import re
-from bs4 import BeautifulSoup
-from PIL import Image
 import io
-from dotenv import load_dotenv
 
+# requests, websocket-client, bs4, Pillow and python-dotenv are imported by
+# the functions that need them so that `--help`, cache hits and importing
+# this module as a library stay cheap. Logging and .env loading happen in
+# initialize(), not at import time.
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('presentation_generator.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
 AUTH_TOKEN = None
-BASE_API_URL = os.getenv('BASE_API_URL')
-AUTH_URL = os.getenv('AUTH_URL')
 PRESENTATION_ID = None
 SLIDE_ID = None
-API_KEY = os.getenv('ALAI_API_KEY')
-FIRE_CRAWL_API_KEY = os.getenv('FIRE_CRAWL_API_KEY')
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+USER_AGENT = "MayankBot/1.0 (+https://github.com/mayankrai449)"
+ALAI_WS_URL = "wss://alai-standalone-backend.getalai.com"
+DEFAULT_SLIDE_COUNT = 5
+MAX_SLIDE_COUNT = 60
+RESULT_CACHE_LOCK = threading.Lock()
+AUTH_VERIFIED_AT = None
+HTTP_SESSION = None
+INITIALIZED = False
+INIT_LOCK = threading.Lock()
+
+def parse_size(value):
+    """Parse a byte count such as "500M" or "2G" (K/M/G are powers of 1024)"""
+    value = str(value).strip().upper().rstrip("B")
+    multipliers = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if value and value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(float(value))
+
+def load_settings(load_env_file=True):
+    """Read every environment-driven setting, optionally loading .env first"""
+    global BASE_API_URL, AUTH_URL, API_KEY, FIRE_CRAWL_API_KEY, SLIDE_VARIANT_WORKERS
+    global HTTP_TIMEOUT, SCRAPE_TIMEOUT, WS_PING_INTERVAL, WS_PING_TIMEOUT, WS_IDLE_TIMEOUT
+    global WS_WARM_POOL_SIZE, WS_WARM_MAX_IDLE, WS_DNS_TTL
+    global STAGE_TIMEOUTS, PRESENTATION_TIMEOUT, RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+    global CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, SLIDE_VARIANT_ATTEMPTS, RATE_LIMITS, RATE_LIMIT_DIR
+    global RESULT_CACHE_FILE, RESULT_CACHE_TTL, AUTH_RECHECK_INTERVAL, SCRAPE_REUSE_WINDOW
+    global SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_QUEUE_SIZE, SERVICE_JOB_HISTORY
+    global SERVICE_SUPERVISE_INTERVAL
+    global SLIDE_COUNT, SLIDE_CONTEXT_CHARS, UPLOAD_BATCH_SIZE
+    global CRAWL_MAX_PAGES, CRAWL_CONCURRENCY, CRAWL_CONTEXT_BUDGET, CRAWL_MAX_IMAGES
+    global IMAGE_STORE_DIR, IMAGE_REVALIDATE_AFTER
+    global LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, STORAGE_MAX_BYTES, STORAGE_MAX_AGE, STORAGE_GC_AFTER_RUN
+    global PROFILE_TOP_ALLOCATIONS, PROFILE_TRACEMALLOC_FRAMES
+
+    if load_env_file:
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    BASE_API_URL = os.getenv('BASE_API_URL')
+    AUTH_URL = os.getenv('AUTH_URL')
+    API_KEY = os.getenv('ALAI_API_KEY')
+    FIRE_CRAWL_API_KEY = os.getenv('FIRE_CRAWL_API_KEY')
+    SLIDE_VARIANT_WORKERS = int(os.getenv('SLIDE_VARIANT_WORKERS', '5'))
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+    SCRAPE_TIMEOUT = float(os.getenv('SCRAPE_TIMEOUT', '120'))
+    WS_PING_INTERVAL = float(os.getenv('WS_PING_INTERVAL', '20'))
+    WS_PING_TIMEOUT = float(os.getenv('WS_PING_TIMEOUT', '10'))
+    WS_IDLE_TIMEOUT = float(os.getenv('WS_IDLE_TIMEOUT', '90'))
+    # Pre-opened connections kept per WebSocket host (0 lets each stage dial on its own)
+    WS_WARM_POOL_SIZE = int(os.getenv('WS_WARM_POOL_SIZE', '2'))
+    WS_WARM_MAX_IDLE = float(os.getenv('WS_WARM_MAX_IDLE', '15'))
+    WS_DNS_TTL = float(os.getenv('WS_DNS_TTL', '300'))
+    STAGE_TIMEOUTS = {
+        "generate_slides_outline": float(os.getenv('OUTLINE_STAGE_TIMEOUT', '180')),
+        "create_slides_from_outlines": float(os.getenv('CREATE_SLIDES_STAGE_TIMEOUT', '300')),
+        "create_and_stream_slide_variants": float(os.getenv('SLIDE_VARIANTS_STAGE_TIMEOUT', '180')),
+    }
+    PRESENTATION_TIMEOUT = float(os.getenv('PRESENTATION_TIMEOUT', '900'))
+    RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '4'))
+    RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.5'))
+    RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '15'))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+    SLIDE_VARIANT_ATTEMPTS = int(os.getenv('SLIDE_VARIANT_ATTEMPTS', '2'))
+    # Requests per second and burst size for each endpoint class, as "rate/burst".
+    # Image downloads get one bucket per origin.
+    RATE_LIMITS = {
+        "firecrawl:scrape": os.getenv('RATE_LIMIT_FIRECRAWL_SCRAPE', '2/5'),
+        "alai:rest": os.getenv('RATE_LIMIT_ALAI_REST', '5/10'),
+        "alai:ws": os.getenv('RATE_LIMIT_ALAI_WS', '2/5'),
+        "image": os.getenv('RATE_LIMIT_IMAGE_PER_ORIGIN', '5/10'),
+        "page": os.getenv('RATE_LIMIT_PAGE_PER_ORIGIN', '2/5'),
+    }
+    # Directory holding bucket state files; set it to share limits between processes
+    RATE_LIMIT_DIR = os.getenv('RATE_LIMIT_DIR')
+    RESULT_CACHE_FILE = os.getenv('RESULT_CACHE_FILE', 'result_cache.json')
+    RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', str(7 * 24 * 3600)))
+    AUTH_RECHECK_INTERVAL = float(os.getenv('AUTH_RECHECK_INTERVAL', '300'))
+    # A scrape finished by another process less than this many seconds ago is reused
+    SCRAPE_REUSE_WINDOW = float(os.getenv('SCRAPE_REUSE_WINDOW', '60'))
+    SERVICE_HOST = os.getenv('SERVICE_HOST', '127.0.0.1')
+    SERVICE_PORT = int(os.getenv('SERVICE_PORT', '8080'))
+    SERVICE_WORKERS = int(os.getenv('SERVICE_WORKERS', '2'))
+    SERVICE_QUEUE_SIZE = int(os.getenv('SERVICE_QUEUE_SIZE', '20'))
+    SERVICE_JOB_HISTORY = int(os.getenv('SERVICE_JOB_HISTORY', '1000'))
+    SERVICE_SUPERVISE_INTERVAL = float(os.getenv('SERVICE_SUPERVISE_INTERVAL', '1'))
+    SLIDE_COUNT = int(os.getenv('SLIDE_COUNT', str(DEFAULT_SLIDE_COUNT)))
+    # Source material attached to each slide of a large deck
+    SLIDE_CONTEXT_CHARS = int(os.getenv('SLIDE_CONTEXT_CHARS', '4000'))
+    UPLOAD_BATCH_SIZE = int(os.getenv('UPLOAD_BATCH_SIZE', '5'))
+    CRAWL_MAX_PAGES = int(os.getenv('CRAWL_MAX_PAGES', '10'))
+    CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', '4'))
+    CRAWL_CONTEXT_BUDGET = int(os.getenv('CRAWL_CONTEXT_BUDGET', '19000'))
+    CRAWL_MAX_IMAGES = int(os.getenv('CRAWL_MAX_IMAGES', '10'))
+    IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR', 'image_store')
+    # A stored image checked less than this many seconds ago is reused without a conditional GET
+    IMAGE_REVALIDATE_AFTER = float(os.getenv('IMAGE_REVALIDATE_AFTER', '300'))
+    LOG_FILE = os.getenv('LOG_FILE', 'presentation_generator.log')
+    LOG_MAX_BYTES = parse_size(os.getenv('LOG_MAX_BYTES', '10M'))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '3'))
+    # Budget for scraped_data/, the image store, response JSON files, profile reports and rotated logs together
+    STORAGE_MAX_BYTES = parse_size(os.getenv('STORAGE_MAX_BYTES', '1G'))
+    STORAGE_MAX_AGE = float(os.getenv('STORAGE_MAX_AGE_DAYS', '30')) * 24 * 3600
+    STORAGE_GC_AFTER_RUN = os.getenv('STORAGE_GC_AFTER_RUN', 'true').lower() in ('1', 'true', 'yes')
+    PROFILE_TOP_ALLOCATIONS = int(os.getenv('PROFILE_TOP_ALLOCATIONS', '25'))
+    PROFILE_TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '1'))
+
+load_settings(load_env_file=False)
+
+def configure_logging():
+    """Send log records to LOG_FILE (rotated at LOG_MAX_BYTES) and the console"""
+    from logging.handlers import RotatingFileHandler
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT),
+            logging.StreamHandler()
+        ]
+    )
+
+def initialize(setup_logging=True):
+    """Load .env and set up logging once per process, on first real use"""
+    global INITIALIZED
+    with INIT_LOCK:
+        if INITIALIZED:
+            return
+        load_settings()
+        if setup_logging:
+            configure_logging()
+        INITIALIZED = True
+
+CANCEL_EVENT = threading.Event()
+CANCEL_REASON = None
+DEADLINE_TIMER = None
 SLIDES_DATA = []
+SECTION_CONTEXTS = []
 ALL_RESPONSES = []
+PROFILER = None
+
+DEFAULT_INSTRUCTIONS = """Create a professional presentation with exactly 5 slides, designed for a business audience. 
+    Structure the content as follows: Slide 1 is an engaging title slide with a concise subtitle summarizing the topic without host name; 
+    Slides 2-4 are content slides with key points derived from the provided data; 
+    Slide 5 is a conclusion slide with actionable insights or a summary. 
+    Use bullet points or tables for clarity, ensuring visually appealing formats with consistent fonts and spacing. 
+    Maintain a professional and concise tone throughout, avoiding jargon unless contextually appropriate. 
+    Incorporate provided images as follows: include one relevant image per slide (Slides 1, 2, 3, 4, and 5), 
+    each sized to approximately 1/4th of the slide area, positioned to complement the text (e.g., right-aligned or top-aligned). 
+    If fewer than 5 images are provided, prioritize their placement on content slides (2-4) and use subtle placeholders or icons on remaining slides. 
+    Apply a cohesive color scheme (e.g., corporate blues or neutrals) and minimal animations to enhance professionalism. 
+    Ensure each slide is complete, self-contained, and balanced in content and design."""
+
+def build_instructions(slide_count=DEFAULT_SLIDE_COUNT):
+    """Default presentation instructions for a deck of slide_count slides"""
+    if slide_count == DEFAULT_SLIDE_COUNT:
+        return DEFAULT_INSTRUCTIONS
+    title_slide = "Slide 1 is an engaging title slide with a concise subtitle summarizing the topic without host name"
+    conclusion_slide = f"Slide {slide_count} is a conclusion slide with actionable insights or a summary"
+    if slide_count == 1:
+        structure = ("Slide 1 is the only slide: a title with a concise subtitle summarizing the topic without host name, "
+                     "followed by the key points derived from the provided data and one actionable insight")
+    elif slide_count == 2:
+        structure = (f"{title_slide}; Slide 2 is a content slide with the key points derived from the provided data, "
+                     "closing with actionable insights or a summary")
+    elif slide_count == 3:
+        structure = f"{title_slide}; Slide 2 is a content slide with key points derived from the provided data; {conclusion_slide}"
+    else:
+        structure = (f"{title_slide}; Slides 2-{slide_count - 1} are content slides with key points derived from the provided data, "
+                     f"each focused on its own section of the source material and not repeating other slides; {conclusion_slide}")
+    return f"""Create a professional presentation with exactly {slide_count} slide{"s" if slide_count > 1 else ""}, designed for a business audience. 
+    Structure the content as follows: {structure}. 
+    Use bullet points or tables for clarity, ensuring visually appealing formats with consistent fonts and spacing. 
+    Maintain a professional and concise tone throughout, avoiding jargon unless contextually appropriate. 
+    Incorporate provided images as follows: include at most one relevant image per slide, 
+    each sized to approximately 1/4th of the slide area, positioned to complement the text (e.g., right-aligned or top-aligned). 
+    If fewer images than slides are provided, prioritize their placement on content slides and use subtle placeholders or icons on remaining slides. 
+    Apply a cohesive color scheme (e.g., corporate blues or neutrals) and minimal animations to enhance professionalism. 
+    Ensure each slide is complete, self-contained, and balanced in content and design."""
+
+
+class PresentationCancelled(Exception):
+    """Raised when the running presentation job has been cancelled"""
+
+
+class CircuitOpenError(Exception):
+    """Raised when an upstream's circuit breaker is refusing calls"""
+
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker shared by every thread in the process
+
+    After CIRCUIT_FAILURE_THRESHOLD consecutive failures the circuit opens
+    and calls fail fast for CIRCUIT_RESET_TIMEOUT seconds. A single trial
+    call is then let through; its outcome closes or re-opens the circuit.
+    A trial that ends without an outcome (e.g. the job was cancelled) must
+    be handed back with release_trial().
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls are refused; returns True if this call is the half-open trial"""
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            remaining = (self.reset_timeout or CIRCUIT_RESET_TIMEOUT) - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self.trial_in_flight:
+                raise CircuitOpenError(f"{self.name} circuit is open, retry in {max(remaining, 0):.0f}s")
+            self.trial_in_flight = True
+            return True
+
+    def release_trial(self):
+        """Let another trial through after one ended without a success or failure"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"{self.name} circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= (self.failure_threshold or CIRCUIT_FAILURE_THRESHOLD):
+                if self.opened_at is None:
+                    logger.warning(f"{self.name} circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+
+CIRCUIT_BREAKERS = {
+    "alai": CircuitBreaker("alai"),
+    "firecrawl": CircuitBreaker("firecrawl"),
+}
+UPSTREAM_RATE_LIMITS = {
+    "alai": "alai:rest",
+    "firecrawl": "firecrawl:scrape",
+}
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by every thread in the process
+
+    When state_file is given the bucket state lives in that file and is
+    updated under an exclusive flock, so every process pointing at the
+    same file draws from a single bucket. Time spent waiting for a token
+    is recorded for the queue-wait metrics.
+    """
+
+    def __init__(self, name, rate, capacity, state_file=None):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.state_file = state_file
+        self.tokens = capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _take(self, state):
+        """Refill state from elapsed time and take a token; returns seconds to wait if none is available"""
+        now = time.time()
+        tokens = min(self.capacity, state["tokens"] + (now - state["updated"]) * self.rate)
+        state["updated"] = now
+        if tokens >= 1:
+            state["tokens"] = tokens - 1
+            return 0.0
+        state["tokens"] = tokens
+        return (1 - tokens) / self.rate
+
+    def _try_acquire(self):
+        if not self.state_file:
+            state = {"tokens": self.tokens, "updated": self.updated}
+            delay = self._take(state)
+            self.tokens, self.updated = state["tokens"], state["updated"]
+            return delay
+
+        import fcntl
+
+        fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.read(fd, 4096)
+            try:
+                state = json.loads(raw) if raw else {}
+            except ValueError:
+                state = {}
+            state.setdefault("tokens", self.capacity)
+            state.setdefault("updated", time.time())
+            delay = self._take(state)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, json.dumps(state).encode())
+            return delay
+        finally:
+            os.close(fd)
+
+    def acquire(self):
+        """Block until a token is available, honouring job cancellation"""
+        started_at = time.monotonic()
+        queued = False
+        while True:
+            with self.lock:
+                delay = self._try_acquire()
+                if delay <= 0:
+                    waited = time.monotonic() - started_at if queued else 0.0
+                    self.acquired += 1
+                    self.total_wait += waited
+                    self.max_wait = max(self.max_wait, waited)
+                    if queued:
+                        self.waited += 1
+                    return waited
+            queued = True
+            if CANCEL_EVENT.wait(delay):
+                raise_if_cancelled(f"rate limiter {self.name}")
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "rate": self.rate,
+                "burst": self.capacity,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "total_wait_seconds": round(self.total_wait, 3),
+                "avg_wait_seconds": round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+                "max_wait_seconds": round(self.max_wait, 3),
+            }
+
+
+RATE_LIMITERS = {}
+RATE_LIMITERS_LOCK = threading.Lock()
+
+def slide_count_arg(value):
+    count = int(value)
+    if not 1 <= count <= MAX_SLIDE_COUNT:
+        raise argparse.ArgumentTypeError(f"must be between 1 and {MAX_SLIDE_COUNT}")
+    return count
+
+def configure_argparse(argv=None):
+    """Configure and parse command line arguments
+
+    `script.py serve ...` starts the HTTP service, `script.py gc ...` cleans
+    up stored artifacts; anything else is a one-shot run for a single URL.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv and argv[0] == "serve":
+        parser = argparse.ArgumentParser(prog='script.py serve', description='Run the presentation generator as a local HTTP service')
+        parser.add_argument('--host', default=SERVICE_HOST, help='Interface to listen on')
+        parser.add_argument('--port', type=int, default=SERVICE_PORT, help='Port to listen on')
+        parser.add_argument('--workers', type=int, default=SERVICE_WORKERS, help='Number of worker processes')
+        parser.add_argument('--queue-size', type=int, default=SERVICE_QUEUE_SIZE, help='Maximum number of queued jobs')
+        parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+        args = parser.parse_args(argv[1:])
+        args.command = "serve"
+        return args
+
+    if argv and argv[0] == "gc":
+        parser = argparse.ArgumentParser(prog='script.py gc', description='Evict old scraped data, response files and rotated logs')
+        parser.add_argument('--max-bytes', type=parse_size, default=STORAGE_MAX_BYTES,
+                            help='Total size budget, e.g. 500M or 2G')
+        parser.add_argument('--max-age-days', type=float, default=STORAGE_MAX_AGE / (24 * 3600),
+                            help='Remove artifacts not used for this many days (0 disables)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+        parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+        args = parser.parse_args(argv[1:])
+        args.command = "gc"
+        return args
 
-def configure_argparse():
-    """Configure and parse command line arguments"""
     parser = argparse.ArgumentParser(description='Generate Alai presentation from webpage content')
     parser.add_argument('url', help='URL of the webpage to scrape')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
-    return parser.parse_args()
+    parser.add_argument('--profile', action='store_true',
+                        help='Write per-stage cProfile stats and top-allocator reports next to the run journal')
+    parser.add_argument('--timeout', type=float, default=PRESENTATION_TIMEOUT,
+                        help='Overall deadline in seconds for the whole job, scraping included')
+    parser.add_argument('--force', action='store_true',
+                        help='Regenerate the presentation even if an identical one is cached')
+    parser.add_argument('--cache-ttl', type=float, default=RESULT_CACHE_TTL,
+                        help='Seconds a cached presentation link stays valid (0 disables the cache)')
+    parser.add_argument('--slides', type=slide_count_arg, default=SLIDE_COUNT,
+                        help=f'Number of slides in the deck (1-{MAX_SLIDE_COUNT})')
+    parser.add_argument('--crawl', action='store_true',
+                        help='Build one deck from the URL and the pages it links to under the same path')
+    parser.add_argument('--max-pages', type=int, default=CRAWL_MAX_PAGES, help='Maximum number of pages to crawl')
+    parser.add_argument('--path-prefix', help="Only crawl pages whose path starts with this (default: the URL's directory)")
+    args = parser.parse_args(argv)
+    args.command = "generate"
+    return args
+
+def normalize_url(url):
+    """Canonical form of a URL used to recognise identical requests"""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme, netloc.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, parsed.path or "/", parsed.params, query, ""))
+
+def scrape_output_dir(target_url):
+    safe_name = normalize_url(target_url).replace("https://", "").replace("http://", "").replace("/", "_")
+    return os.path.join("scraped_data", safe_name)
+
+@contextmanager
+def file_lock(path):
+    """Exclusive inter-process lock held on path for the duration of the block"""
+    import fcntl
+
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def write_file_atomic(path, data, mode='w', encoding='utf-8'):
+    """Write data to a temporary file and rename it over path"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, mode, encoding=encoding if 'b' not in mode else None) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into a single execution
+
+    The first caller for a key runs the function; callers arriving while
+    it is in flight wait for it and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self.calls[key] = call
+
+        if not leader:
+            logger.info(f"Joining in-flight call for {key}")
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
 
-def scrape_webpage(target_url, api_token):
-    firecrawl_url = os.getenv('FIRE_CRAWL_URL')
-    safe_name = target_url.replace("https://", "").replace("http://", "").replace("/", "_")
-    url_dir = os.path.join("scraped_data", safe_name)
-    image_dir = os.path.join(url_dir, "images")
+        try:
+            call["result"] = fn(*args, **kwargs)
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
+
+
+SCRAPE_FLIGHTS = SingleFlight()
+
+
+class StageProfiler:
+    """Collects cProfile stats and tracemalloc allocation diffs per pipeline stage
+
+    Repeated stages (one per page or per slide) are merged under one name.
+    A stage opened inside another stage on the same thread counts toward
+    the outer one. cProfile only sees the thread that enabled it, so work
+    handed to a thread pool is profiled by opening the stage inside the
+    task itself (as download_image and process_single_slide_variant do).
+    tracemalloc is process-wide, so the allocation diff of a stage that
+    overlaps others (crawl pages, slide variants) includes their
+    allocations too.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stages = {}
+        self.started_tracing = False
+
+    def start(self):
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self.started_tracing = True
+
+    def stop(self):
+        import tracemalloc
+
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        import cProfile
+        import tracemalloc
+
+        if getattr(self.local, "active", None):
+            yield
+            return
+
+        self.local.active = name
+        before = tracemalloc.take_snapshot()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active cProfile per process; overlapping stages only get timings and allocations
+            profile = None
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started_at
+            if profile is not None:
+                profile.disable()
+            diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+            self.local.active = None
+            self.record(name, profile, elapsed, diff)
+
+    def record(self, name, profile, elapsed, diff):
+        import tracemalloc
+
+        with self.lock:
+            stage = self.stages.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "profiles": [], "allocations": {}})
+            stage["calls"] += 1
+            stage["wall_seconds"] += elapsed
+            if profile is not None:
+                stage["profiles"].append(profile)
+            for stat in diff:
+                if (not stat.size_diff and not stat.count_diff) or stat.traceback[0].filename == tracemalloc.__file__:
+                    continue
+                location = str(stat.traceback)
+                size, count = stage["allocations"].get(location, (0, 0))
+                stage["allocations"][location] = (size + stat.size_diff, count + stat.count_diff)
+
+    def pending(self):
+        with self.lock:
+            return bool(self.stages)
+
+    def write(self, output_dir):
+        """Write <n>_<stage>.pstats and <n>_<stage>.alloc.txt per stage; return a summary"""
+        import pstats
+        import tracemalloc
+
+        os.makedirs(output_dir, exist_ok=True)
+        with self.lock:
+            stages, self.stages = self.stages, {}
+
+        summary = {"dir": output_dir, "stages": {}}
+        if tracemalloc.is_tracing():
+            summary["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        for index, (name, stage) in enumerate(stages.items(), 1):
+            prefix = os.path.join(output_dir, f"{index:02d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}")
+            if stage["profiles"]:
+                pstats.Stats(*stage["profiles"]).dump_stats(prefix + ".pstats")
+
+            top = sorted(stage["allocations"].items(), key=lambda item: item[1][0], reverse=True)
+            lines = [f"Top allocators in stage {name} (net change over {stage['calls']} call(s))", ""]
+            lines += [f"{size / 1024:+12.1f} KiB {count:+9d} blocks  {location}"
+                      for location, (size, count) in top[:PROFILE_TOP_ALLOCATIONS]]
+            write_file_atomic(prefix + ".alloc.txt", "\n".join(lines) + "\n")
+
+            summary["stages"][name] = {
+                "calls": stage["calls"],
+                "wall_seconds": round(stage["wall_seconds"], 3),
+                "cpu_profiled": bool(stage["profiles"]),
+                "net_allocated_bytes": sum(size for size, _ in stage["allocations"].values())
+            }
+        logger.info(f"Profile for {len(stages)} stages written to {output_dir}")
+        return summary
+
+def profile_stage(name):
+    """Profile the enclosed block as stage name when a --profile run is active"""
+    profiler = PROFILER
+    return profiler.stage(name) if profiler is not None else nullcontext()
+
+def start_profiling():
+    """Start profiling this run; returns False if a profiled run is already active"""
+    global PROFILER
+    if PROFILER is not None:
+        return False
+    PROFILER = StageProfiler()
+    PROFILER.start()
+    return True
 
-    os.makedirs(image_dir, exist_ok=True)
+def stop_profiling():
+    """Write any stages not yet in a run journal and stop profiling"""
+    global PROFILER
+    try:
+        if PROFILER.pending():
+            save_responses_to_file()
+    finally:
+        PROFILER.stop()
+        PROFILER = None
+
+def scrape_webpage(target_url, api_token=None, max_images=10):
+    """Scrape target_url, sharing one scrape between concurrent identical requests
+
+    Threads share an in-flight scrape directly. Other processes wait on a
+    lock on the output directory and reuse a scrape finished within
+    SCRAPE_REUSE_WINDOW seconds, if it fetched at least max_images images,
+    instead of fetching the page again.
+    Loads .env on first use; api_token defaults to FIRE_CRAWL_API_KEY.
+    """
+    initialize()
+    api_token = api_token or FIRE_CRAWL_API_KEY
+    return SCRAPE_FLIGHTS.do(
+        (normalize_url(target_url), max_images), scrape_webpage_locked, target_url, api_token, max_images
+    )
+
+def scrape_webpage_locked(target_url, api_token, max_images=10):
+    url_dir = scrape_output_dir(target_url)
+    os.makedirs(url_dir, exist_ok=True)
+    marker_filename = os.path.join(url_dir, "scrape.json")
+
+    with file_lock(os.path.join(url_dir, ".lock")):
+        try:
+            with open(marker_filename, 'r') as f:
+                marker = json.load(f)
+            # A scrape that fetched fewer images than requested is not reused
+            if (time.time() - marker["scraped_at"] < SCRAPE_REUSE_WINDOW
+                    and marker.get("max_images", 0) >= max_images):
+                with open(os.path.join(url_dir, "content.txt"), 'r', encoding='utf-8') as f:
+                    logger.info(f"Reusing scrape of {target_url} finished {time.time() - marker['scraped_at']:.0f}s ago")
+                    return f.read(), url_dir
+        except (OSError, ValueError, KeyError):
+            pass
+
+        result = fetch_webpage(target_url, api_token, max_images)
+        if isinstance(result, tuple):
+            write_file_atomic(marker_filename, json.dumps({
+                "url": target_url, "scraped_at": time.time(), "max_images": max_images
+            }))
+        return result
+
+def clean_markdown(md):
+    md = re.sub(r'!\[.*?\]\(\s*[\|\s]*\)', '', md)
+    md = re.sub(r'!\[.*?\]\(.*?\)', '', md)
+    md = re.sub(r'\[([^\]]+)\]\((.*?)\)', r'\1', md)
+    md = re.sub(r'http[s]?://\S+', '', md)
+    md = re.sub(r'^\s*\|.*?\|\s*$', '', md, flags=re.MULTILINE)
+    md = re.sub(r'^\s*:?[-| ]+:?\s*$', '', md, flags=re.MULTILINE)
+    md = re.sub(r'^#{1,6}\s+', '', md, flags=re.MULTILINE)
+    md = re.sub(r'^[-*_]{3,}\s*$', '', md, flags=re.MULTILINE)
+    md = re.sub(r'(\*\*|__)(.*?)\1', r'\2', md)
+    md = re.sub(r'(\*|_)(.*?)\1', r'\2', md)
+    md = re.sub(r'`{1,3}(.*?)`{1,3}', r'\1', md)
+    md = re.sub(r'^\s*[-*+]\s+', '', md, flags=re.MULTILINE)
+    md = re.sub(r'\n{3,}', '\n\n', md)
+    md = re.sub(r'[ \t]+', ' ', md)
+    md = re.sub(r'\n\s*\n', '\n\n', md)
+
+    return md.strip()
+
+def store_processed_image(image_data, extension):
+    """Convert image bytes for upload and keep the result in the image store
+
+    Variants are keyed by the hash of the source bytes and the target
+    extension, so identical images from any page or URL are processed once.
+    Returns the stored file's path.
+    """
+    from PIL import Image
+
+    ext_map = {
+        '.jpg': 'JPEG',
+        '.jpeg': 'JPEG',
+        '.png': 'PNG',
+        '.gif': 'GIF',
+        '.webp': 'WEBP'
+    }
+
+    ext = extension.lower() if extension.lower() in ext_map else '.jpg'
+    digest = hashlib.sha256(image_data + ext.encode()).hexdigest()
+    object_dir = os.path.join(IMAGE_STORE_DIR, "objects", digest[:2])
+    object_path = os.path.join(object_dir, f"{digest}{ext}")
+    if os.path.exists(object_path):
+        os.utime(object_path)
+        return object_path
+
+    img = Image.open(io.BytesIO(image_data))
+
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGB')
+
+    os.makedirs(object_dir, exist_ok=True)
+    tmp_filename = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    img.save(tmp_filename, format=ext_map[ext])
+    os.replace(tmp_filename, object_path)
+    return object_path
+
+def link_image(object_path, image_dir, index):
+    """Hard-link a stored image into image_dir as img<index>, copying if linking is not possible"""
+    import shutil
+
+    ext = os.path.splitext(object_path)[1]
+    for name in os.listdir(image_dir):
+        if os.path.splitext(name)[0] == f"img{index}" and name != f"img{index}{ext}":
+            os.remove(os.path.join(image_dir, name))
+
+    img_filename = os.path.join(image_dir, f"img{index}{ext}")
+    if os.path.exists(img_filename) and os.path.samefile(object_path, img_filename):
+        logger.info(f"Image {img_filename} is already linked")
+        return
+    tmp_filename = f"{img_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(object_path, tmp_filename)
+    except OSError:
+        shutil.copyfile(object_path, tmp_filename)
+    os.replace(tmp_filename, img_filename)
+    logger.info(f"Saved image to {img_filename}")
+
+def clear_image_dir(image_dir):
+    """Remove images left by an earlier scrape so they are not uploaded as the current page's"""
+    for filename in os.listdir(image_dir):
+        os.remove(os.path.join(image_dir, filename))
+
+def image_index(filename):
+    """Numeric index of an img<index> file, so img2 sorts before img10"""
+    match = re.match(r"img(\d+)", filename)
+    return int(match.group(1)) if match else float("inf")
+
+def save_image(image_data, extension, image_dir, index):
+    try:
+        link_image(store_processed_image(image_data, extension), image_dir, index)
+        return True
 
+    except Exception as e:
+        logger.error(f"Failed to process image: {str(e)}")
+        return False
+
+def image_store_entry_path(img_url):
+    digest = hashlib.sha256(img_url.encode()).hexdigest()
+    return os.path.join(IMAGE_STORE_DIR, "urls", f"{digest}.json")
+
+def fetch_stored_image(img_url, extension):
+    """Return the stored file for img_url, downloading it only when it changed
+
+    The URL's ETag and Last-Modified are kept next to the stored variant and
+    sent as a conditional GET once the copy is IMAGE_REVALIDATE_AFTER
+    seconds old; a 304 reuses the stored file without transferring it.
+    """
+    entry_path = image_store_entry_path(img_url)
+    entry = None
+    try:
+        with open(entry_path, 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        pass
+    object_path = os.path.join(IMAGE_STORE_DIR, entry["object"]) if entry else None
+    if not object_path or not os.path.exists(object_path):
+        entry = None
+
+    if entry and time.time() - entry.get("checked_at", 0) < IMAGE_REVALIDATE_AFTER:
+        logger.info(f"Reusing stored image for {img_url}")
+        os.utime(object_path)
+        return object_path
+
+    headers = {"User-Agent": USER_AGENT}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    img_response = request_with_retry(
+        "GET", img_url, step_name="download_image",
+        rate_limit=f"image:{urlparse(img_url).netloc}", timeout=min(HTTP_TIMEOUT, 10),
+        headers=headers
+    )
+
+    if entry and img_response.status_code == 304:
+        logger.info(f"Stored image still current: {img_url}")
+        os.utime(object_path)
+    else:
+        img_response.raise_for_status()
+        object_path = store_processed_image(img_response.content, extension)
+        entry = {
+            "url": img_url,
+            "object": os.path.relpath(object_path, IMAGE_STORE_DIR),
+            "etag": img_response.headers.get("ETag"),
+            "last_modified": img_response.headers.get("Last-Modified")
+        }
+
+    entry["checked_at"] = time.time()
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    write_file_atomic(entry_path, json.dumps(entry))
+    return object_path
+
+IMAGE_FLIGHTS = SingleFlight()
+
+def download_image(img_src, base_url, image_dir, index):
+    """Decode or fetch one image source through the image store and link it in as img<index>"""
+    with profile_stage("images"):
+        try:
+            if img_src.startswith('data:image'):
+                img_format = img_src.split(';')[0].split('/')[1]
+                ext_map = {
+                    'jpeg': '.jpg',
+                    'jpg': '.jpg',
+                    'png': '.png',
+                    'gif': '.gif',
+                    'webp': '.webp'
+                }
+                ext = ext_map.get(img_format.lower(), '.jpg')
+                img_data = base64.b64decode(img_src.split(',')[1])
+                return save_image(img_data, ext, image_dir, index)
+            else:
+                img_url = urljoin(base_url, img_src)
+                img_ext = os.path.splitext(img_url.split('?')[0])[1].lower()
+                if img_ext not in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
+                    img_ext = '.jpg'
+                object_path = IMAGE_FLIGHTS.do(img_url, fetch_stored_image, img_url, img_ext)
+                link_image(object_path, image_dir, index)
+                return True
+        except Exception as e:
+            logger.error(f"Failed to download or save image: {str(e)}")
+            return False
+
+def download_images(img_srcs, base_url, image_dir):
+    """Download img_srcs in parallel as img1, img2, ...; returns how many were saved"""
+    downloaded = 0
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = {
+            executor.submit(download_image, img_src, base_url, image_dir, i + 1): i
+            for i, img_src in enumerate(img_srcs)
+        }
+        for future in as_completed(futures):
+            if future.result():
+                downloaded += 1
+    return downloaded
+
+def extract_image_sources(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    return [img['src'] for img in soup.find_all('img', src=True)]
+
+def firecrawl_scrape(target_url, api_token):
+    """Scrape one URL through Firecrawl and return the parsed JSON result"""
     payload = {
         "url": target_url,
         "formats": ["markdown", "html"],
@@ -67,52 +900,21 @@ def scrape_webpage(target_url, api_token):
         "Content-Type": "application/json"
     }
 
-    def save_image(image_data, extension, index):
-        try:
-            img = Image.open(io.BytesIO(image_data))
-
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-
-            ext_map = {
-                '.jpg': 'JPEG',
-                '.jpeg': 'JPEG',
-                '.png': 'PNG',
-                '.gif': 'GIF',
-                '.webp': 'WEBP'
-            }
-
-            ext = extension.lower() if extension.lower() in ext_map else '.jpg'
-            fmt = ext_map.get(ext, 'JPEG')
-
-            img_filename = os.path.join(image_dir, f"img{index}{ext}")
-            img.save(img_filename, format=fmt)
-            logger.info(f"Saved image to {img_filename}")
-            return True
+    logger.info(f"Scraping webpage: {target_url}")
+    response = request_with_retry(
+        "POST", os.getenv('FIRE_CRAWL_URL'), upstream="firecrawl", step_name="scrape_webpage",
+        json=payload, headers=headers, timeout=SCRAPE_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json()
 
-        except Exception as e:
-            logger.error(f"Failed to process image: {str(e)}")
-            return False
+def fetch_webpage(target_url, api_token, max_images=10):
+    import requests
 
-    def clean_markdown(md):
-        md = re.sub(r'!\[.*?\]\(\s*[\|\s]*\)', '', md)
-        md = re.sub(r'!\[.*?\]\(.*?\)', '', md)
-        md = re.sub(r'\[([^\]]+)\]\((.*?)\)', r'\1', md)
-        md = re.sub(r'http[s]?://\S+', '', md)
-        md = re.sub(r'^\s*\|.*?\|\s*$', '', md, flags=re.MULTILINE)
-        md = re.sub(r'^\s*:?[-| ]+:?\s*$', '', md, flags=re.MULTILINE)
-        md = re.sub(r'^#{1,6}\s+', '', md, flags=re.MULTILINE)
-        md = re.sub(r'^[-*_]{3,}\s*$', '', md, flags=re.MULTILINE)
-        md = re.sub(r'(\*\*|__)(.*?)\1', r'\2', md)
-        md = re.sub(r'(\*|_)(.*?)\1', r'\2', md)
-        md = re.sub(r'`{1,3}(.*?)`{1,3}', r'\1', md)
-        md = re.sub(r'^\s*[-*+]\s+', '', md, flags=re.MULTILINE)
-        md = re.sub(r'\n{3,}', '\n\n', md)
-        md = re.sub(r'[ \t]+', ' ', md)
-        md = re.sub(r'\n\s*\n', '\n\n', md)
-
-        return md.strip()
+    url_dir = scrape_output_dir(target_url)
+    image_dir = os.path.join(url_dir, "images")
 
+    os.makedirs(image_dir, exist_ok=True)
 
     try:
         if not api_token:
@@ -120,67 +922,31 @@ def scrape_webpage(target_url, api_token):
         if not target_url.startswith("http"):
             raise ValueError("URL must start with http:// or https://")
 
-        logger.info(f"Scraping webpage: {target_url}")
-        response = requests.post(firecrawl_url, json=payload, headers=headers)
-        response.raise_for_status()
-        result = response.json()
+        with profile_stage("scrape"):
+            result = firecrawl_scrape(target_url, api_token)
 
         clean_text = ""
         if "data" in result and "markdown" in result["data"]:
             markdown_content = result["data"]["markdown"]
-            clean_text = clean_markdown(markdown_content)
+            with profile_stage("clean"):
+                clean_text = clean_markdown(markdown_content)
 
             text_filename = os.path.join(url_dir, "content.txt")
-            with open(text_filename, 'w', encoding='utf-8') as f:
-                f.write(clean_text)
+            write_file_atomic(text_filename, clean_text)
             logger.info(f"Saved clean text to {text_filename}")
         else:
             logger.warning("No markdown content found in the scraped result.")
 
         downloaded = 0
-        img_tags = []
-
-        def download_and_save(i, img):
-            nonlocal downloaded
-            img_src = img['src']
-            try:
-                if img_src.startswith('data:image'):
-                    img_format = img_src.split(';')[0].split('/')[1]
-                    ext_map = {
-                        'jpeg': '.jpg',
-                        'jpg': '.jpg',
-                        'png': '.png',
-                        'gif': '.gif',
-                        'webp': '.webp'
-                    }
-                    ext = ext_map.get(img_format.lower(), '.jpg')
-                    img_data = base64.b64decode(img_src.split(',')[1])
-                    return save_image(img_data, ext, i)
-                else:
-                    img_url = urljoin(target_url, img_src)
-                    img_ext = os.path.splitext(img_url.split('?')[0])[1].lower()
-                    if img_ext not in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-                        img_ext = '.jpg'
-                    img_response = requests.get(img_url, timeout=10, headers={
-                        "User-Agent": "MayankBot/1.0 (+https://github.com/mayankrai449)"
-                    })
-                    img_response.raise_for_status()
-                    return save_image(img_response.content, img_ext, i)
-            except Exception as e:
-                logger.error(f"Failed to download or save image: {str(e)}")
-                return False
+        img_srcs = []
 
+        clear_image_dir(image_dir)
         if "data" in result and "html" in result["data"]:
-            soup = BeautifulSoup(result["data"]["html"], 'html.parser')
-            img_tags = soup.find_all('img', src=True)[:10]
-
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = {executor.submit(download_and_save, i + 1, img): i for i, img in enumerate(img_tags)}
-                for future in as_completed(futures):
-                    if future.result():
-                        downloaded += 1
+            with profile_stage("images"):
+                img_srcs = extract_image_sources(result["data"]["html"])[:max_images]
+            downloaded = download_images(img_srcs, target_url, image_dir)
 
-        if not img_tags or downloaded == 0:
+        if not img_srcs or downloaded == 0:
             logger.warning("No images found in the scraped result.")
             with open(os.path.join(image_dir, ".no_images_found"), 'w') as f:
                 f.write(f"No images found for {target_url}")
@@ -196,6 +962,216 @@ def scrape_webpage(target_url, api_token):
         logger.error(error_msg)
         return error_msg
     
+def crawl_output_dir(seed_url):
+    return scrape_output_dir(seed_url) + "__crawl"
+
+def crawl_path_prefix(seed_url):
+    """Default crawl scope: the seed's directory, e.g. /docs/ for /docs or /docs/index.html
+
+    A last segment without a file extension is treated as a directory.
+    """
+    path = urlparse(seed_url).path or "/"
+    if path.endswith("/"):
+        return path
+    head, _, last = path.rpartition("/")
+    return path + "/" if "." not in last else head + "/"
+
+def extract_links(html, base_url):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    return [urljoin(base_url, a['href']) for a in soup.find_all('a', href=True)]
+
+def in_crawl_scope(url, seed_url, path_prefix):
+    # Links are normalized before this check, so the seed must be too (e.g. x.com:443 vs x.com)
+    parsed, seed = urlparse(url), urlparse(normalize_url(seed_url))
+    if parsed.scheme not in ("http", "https") or parsed.netloc.lower() != seed.netloc.lower():
+        return False
+    if os.path.splitext(parsed.path)[1].lower() in ('.pdf', '.zip', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.mp4'):
+        return False
+    return (parsed.path or "/").startswith(path_prefix)
+
+def fetch_crawl_page(url, api_token, pages_dir):
+    """Return the cleaned record for one crawled page, scraping it only if it changed
+
+    The page is first fetched directly with the validators (ETag /
+    Last-Modified) saved from the previous crawl. A 304, or a body whose
+    hash is unchanged, reuses the cached record without calling Firecrawl.
+    """
+    cache_filename = os.path.join(pages_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + ".json")
+    cached = None
+    if os.path.exists(cache_filename):
+        try:
+            with open(cache_filename, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = None
+
+    headers = {"User-Agent": USER_AGENT}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    page_response = None
+    try:
+        page_response = request_with_retry(
+            "GET", url, step_name="crawl_page", rate_limit=f"page:{urlparse(url).netloc}", headers=headers
+        )
+    except Exception as e:
+        logger.warning(f"Direct fetch of {url} failed, scraping it anyway: {str(e)}")
+
+    body_hash = None
+    if page_response is not None:
+        if cached and page_response.status_code == 304:
+            logger.info(f"Page unchanged (304): {url}")
+            return cached
+        if page_response.status_code == 200:
+            body_hash = hashlib.sha256(page_response.content).hexdigest()
+            if cached and cached.get("body_hash") == body_hash:
+                logger.info(f"Page unchanged (same content): {url}")
+                return cached
+
+    with profile_stage("scrape"):
+        result = firecrawl_scrape(url, api_token)
+    data = result.get("data", {})
+    html = data.get("html", "")
+    link_html = page_response.text if page_response is not None and page_response.status_code == 200 else html
+    with profile_stage("clean"):
+        text = clean_markdown(data.get("markdown", ""))
+
+    page = {
+        "url": url,
+        "text": text,
+        "links": extract_links(link_html, url) if link_html else [],
+        "images": [urljoin(url, src) for src in extract_image_sources(html)] if html else [],
+        "etag": page_response.headers.get("ETag") if page_response is not None else None,
+        "last_modified": page_response.headers.get("Last-Modified") if page_response is not None else None,
+        "body_hash": body_hash,
+        "fetched_at": time.time()
+    }
+    write_file_atomic(cache_filename, json.dumps(page))
+    return page
+
+def merge_page_texts(pages, budget):
+    """Merge page texts into one context of at most budget characters
+
+    Paragraphs already seen on an earlier page (navigation, footers,
+    repeated blurbs) are dropped, and the budget is shared evenly, with
+    space a short page does not use passed on to the pages after it.
+    """
+    seen = set()
+    page_texts = []
+    for page in pages:
+        paragraphs = []
+        for paragraph in page["text"].split("\n\n"):
+            key = re.sub(r'\s+', ' ', paragraph).strip().lower()
+            if key and key not in seen:
+                seen.add(key)
+                paragraphs.append(paragraph.strip())
+        if paragraphs:
+            page_texts.append("\n\n".join(paragraphs))
+
+    merged = []
+    remaining = budget
+    for i, text in enumerate(page_texts):
+        share = max(remaining, 0) // (len(page_texts) - i)
+        taken = text[:share]
+        if taken:
+            merged.append(taken)
+            remaining -= len(taken) + 2
+    return "\n\n".join(merged)[:budget]
+
+def pool_crawl_images(pages, limit):
+    """Pick image candidates round-robin across pages so every page can contribute"""
+    pool = []
+    seen = set()
+    candidates = [list(page["images"]) for page in pages]
+    while len(pool) < limit and any(candidates):
+        for page_images in candidates:
+            while page_images:
+                img_url = page_images.pop(0)
+                if img_url not in seen:
+                    seen.add(img_url)
+                    pool.append(img_url)
+                    break
+            if len(pool) >= limit:
+                break
+    return pool
+
+def crawl_website(seed_url, api_token=None, max_pages=None, path_prefix=None, max_images=None):
+    """Crawl seed_url and the linked pages under path_prefix into one context
+
+    Pages are fetched breadth-first, CRAWL_CONCURRENCY at a time, up to
+    max_pages. Returns (clean_text, crawl_dir) like scrape_webpage, or an
+    error string. Loads .env on first use; api_token defaults to
+    FIRE_CRAWL_API_KEY.
+    """
+    initialize()
+    api_token = api_token or FIRE_CRAWL_API_KEY
+    max_pages = max_pages or CRAWL_MAX_PAGES
+    path_prefix = path_prefix or crawl_path_prefix(seed_url)
+    crawl_dir = crawl_output_dir(seed_url)
+    pages_dir = os.path.join(crawl_dir, "pages")
+    image_dir = os.path.join(crawl_dir, "images")
+
+    if not api_token:
+        return "Unexpected error: Please provide a valid API token"
+    if not seed_url.startswith("http"):
+        return "Unexpected error: URL must start with http:// or https://"
+
+    os.makedirs(pages_dir, exist_ok=True)
+    os.makedirs(image_dir, exist_ok=True)
+
+    def fetch(url):
+        try:
+            return fetch_crawl_page(url, api_token, pages_dir)
+        except PresentationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to crawl {url}: {str(e)}")
+            return None
+
+    logger.info(f"Crawling {seed_url} under {path_prefix} (up to {max_pages} pages)")
+    seed = normalize_url(seed_url)
+    seen = {seed}
+    frontier = [seed]
+    pages = []
+    with file_lock(os.path.join(crawl_dir, ".lock")), ThreadPoolExecutor(max_workers=CRAWL_CONCURRENCY) as executor:
+        while frontier and len(pages) < max_pages:
+            batch, frontier = frontier[:max_pages - len(pages)], frontier[max_pages - len(pages):]
+            for page in executor.map(fetch, batch):
+                if not page:
+                    continue
+                pages.append(page)
+                for link in page["links"]:
+                    link = normalize_url(link)
+                    if link not in seen and in_crawl_scope(link, seed_url, path_prefix):
+                        seen.add(link)
+                        frontier.append(link)
+
+        if not pages:
+            error_msg = f"Unexpected error: no pages could be crawled from {seed_url}"
+            logger.error(error_msg)
+            return error_msg
+
+        with profile_stage("clean"):
+            clean_text = merge_page_texts(pages, CRAWL_CONTEXT_BUDGET)
+        text_filename = os.path.join(crawl_dir, "content.txt")
+        write_file_atomic(text_filename, clean_text)
+        logger.info(f"Merged {len(pages)} pages into {text_filename} ({len(clean_text)} characters)")
+
+        clear_image_dir(image_dir)
+        with profile_stage("images"):
+            image_pool = pool_crawl_images(pages, max_images or CRAWL_MAX_IMAGES)
+        downloaded = download_images(image_pool, seed_url, image_dir) if image_pool else 0
+        if downloaded == 0:
+            logger.warning("No images found in the crawled pages.")
+            with open(os.path.join(image_dir, ".no_images_found"), 'w') as f:
+                f.write(f"No images found for {seed_url}")
+
+    return clean_text, crawl_dir
+
 def save_responses_to_file():
     """Save all collected responses to a JSON file with timestamp"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -205,13 +1181,15 @@ def save_responses_to_file():
         "metadata": {
             "generated_at": datetime.now().isoformat(),
             "presentation_id": PRESENTATION_ID,
-            "slide_id": SLIDE_ID
+            "slide_id": SLIDE_ID,
+            "rate_limits": rate_limiter_metrics()
         },
         "responses": ALL_RESPONSES
     }
+    if PROFILER is not None:
+        response_data["metadata"]["profile"] = PROFILER.write(f"presentation_responses_{timestamp}.profile")
     
-    with open(filename, 'w') as f:
-        json.dump(response_data, f, indent=4)
+    write_file_atomic(filename, json.dumps(response_data, indent=4))
     
     logger.info(f"All responses saved to {filename}")
     return filename
@@ -231,6 +1209,461 @@ def add_response(step_name, response_data, success=True, error=None):
     ALL_RESPONSES.append(response_entry)
     return response_entry
 
+def cancel_presentation(reason="cancelled"):
+    """Cancel the running presentation job; open WebSocket stages are closed"""
+    global CANCEL_REASON
+    if not CANCEL_EVENT.is_set():
+        CANCEL_REASON = reason
+        logger.warning(f"Cancelling presentation job: {reason}")
+        CANCEL_EVENT.set()
+
+def start_deadline(timeout=None):
+    """Clear earlier cancellation and cancel the job after timeout seconds (PRESENTATION_TIMEOUT by default)
+
+    Returns False, leaving the running deadline in place, when a job
+    deadline has already been started by an enclosing call.
+    """
+    global CANCEL_REASON, DEADLINE_TIMER
+    if DEADLINE_TIMER is not None:
+        return False
+    CANCEL_EVENT.clear()
+    CANCEL_REASON = None
+    timeout = timeout if timeout is not None else PRESENTATION_TIMEOUT
+    DEADLINE_TIMER = threading.Timer(timeout, cancel_presentation, args=(f"deadline of {timeout:.0f}s exceeded",))
+    DEADLINE_TIMER.daemon = True
+    DEADLINE_TIMER.start()
+    return True
+
+def stop_deadline():
+    global DEADLINE_TIMER
+    DEADLINE_TIMER.cancel()
+    DEADLINE_TIMER = None
+
+def raise_if_cancelled(step_name):
+    """Raise PresentationCancelled if the job has been cancelled"""
+    if CANCEL_EVENT.is_set():
+        raise PresentationCancelled(f"{CANCEL_REASON} (at {step_name})")
+
+def get_rate_limiter(key):
+    """Return the shared TokenBucket for an endpoint class, e.g. "alai:rest" or "image:<origin>"."""
+    with RATE_LIMITERS_LOCK:
+        if key not in RATE_LIMITERS:
+            limit = RATE_LIMITS.get(key) or RATE_LIMITS[key.split(":", 1)[0]]
+            rate, _, burst = limit.partition("/")
+            rate = float(rate)
+            burst = float(burst) if burst else max(rate, 1.0)
+            state_file = None
+            if RATE_LIMIT_DIR:
+                os.makedirs(RATE_LIMIT_DIR, exist_ok=True)
+                state_file = os.path.join(RATE_LIMIT_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', key) + ".bucket")
+            RATE_LIMITERS[key] = TokenBucket(key, rate, burst, state_file)
+        return RATE_LIMITERS[key]
+
+def rate_limiter_metrics():
+    """Queue-wait metrics for every rate limiter used so far"""
+    with RATE_LIMITERS_LOCK:
+        limiters = dict(RATE_LIMITERS)
+    return {key: limiter.metrics() for key, limiter in limiters.items()}
+
+def get_http_session():
+    """Shared requests session so connections are pooled across calls and jobs"""
+    global HTTP_SESSION
+    if HTTP_SESSION is None:
+        import requests
+
+        HTTP_SESSION = requests.Session()
+    return HTTP_SESSION
+
+def backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter for the given (1-based) attempt"""
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (attempt - 1))))
+
+def wait_before_retry(step_name, attempt, delay):
+    logger.warning(f"{step_name}: attempt {attempt} failed, retrying in {delay:.1f}s")
+    if CANCEL_EVENT.wait(delay):
+        raise_if_cancelled(step_name)
+
+def request_with_retry(method, url, upstream=None, idempotent=True, step_name=None, rate_limit=None, **kwargs):
+    """Send an HTTP request, retrying transient failures with backoff
+
+    Idempotent requests are retried on connection errors, timeouts and
+    RETRYABLE_STATUS_CODES. Non-idempotent ones are only retried when the
+    server cannot have acted on them: connect timeouts and 429 responses.
+    Calls go through the upstream's circuit breaker, if one is named, and
+    each attempt takes a token from the rate_limit bucket (the upstream's
+    default endpoint class if not given).
+    The final response is returned as-is; the last exception is re-raised.
+    """
+    import requests
+
+    step_name = step_name or url
+    breaker = CIRCUIT_BREAKERS.get(upstream)
+    rate_limit = rate_limit or UPSTREAM_RATE_LIMITS.get(upstream)
+    limiter = get_rate_limiter(rate_limit) if rate_limit else None
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+
+    for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+        raise_if_cancelled(step_name)
+        trial = breaker.before_call() if breaker else False
+        try:
+            if limiter:
+                limiter.acquire()
+            for _, file_tuple in kwargs.get("files") or []:
+                if len(file_tuple) > 1 and hasattr(file_tuple[1], "seek"):
+                    file_tuple[1].seek(0)
+            response = get_http_session().request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if breaker:
+                breaker.record_failure()
+            retryable = idempotent or isinstance(e, requests.exceptions.ConnectTimeout)
+            if not retryable or attempt == RETRY_MAX_ATTEMPTS:
+                raise
+            wait_before_retry(step_name, attempt, backoff_delay(attempt))
+            continue
+        except BaseException:
+            if trial:
+                breaker.release_trial()
+            raise
+
+        transient = response.status_code in RETRYABLE_STATUS_CODES
+        if breaker:
+            if transient:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+        retryable = transient and (idempotent or response.status_code == 429)
+        if not retryable or attempt == RETRY_MAX_ATTEMPTS:
+            return response
+        wait_before_retry(step_name, attempt, backoff_delay(attempt, response.headers.get("Retry-After")))
+
+    return response
+
+class WarmConnectionPool:
+    """Pre-opened TCP/TLS connections to WebSocket hosts, handed to stages instead of dialing
+
+    Connections are opened in the background while earlier stages run, so a
+    stage only pays for the WebSocket upgrade. DNS answers are cached for
+    WS_DNS_TTL and TLS sessions are resumed, which also speeds up the
+    connections opened on demand when the pool is empty. Idle connections
+    older than WS_WARM_MAX_IDLE are dropped before servers time them out.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = False
+        self.idle = {}
+        self.opening = {}
+        self.addresses = {}
+        self.sessions = {}
+        self.context = None
+
+    def endpoint(self, url):
+        parsed = urlparse(url)
+        secure = parsed.scheme == "wss"
+        return parsed.hostname, parsed.port or (443 if secure else 80), secure
+
+    def resolve(self, host, port):
+        with self.lock:
+            cached = self.addresses.get((host, port))
+        if cached and time.monotonic() - cached[1] < WS_DNS_TTL:
+            return cached[0]
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        with self.lock:
+            self.addresses[(host, port)] = (addresses, time.monotonic())
+        return addresses
+
+    def open(self, url):
+        """Open a TCP (and for wss, TLS) connection to url's host"""
+        import ssl
+
+        host, port, secure = self.endpoint(url)
+        error = None
+        for family, socktype, proto, _, address in self.resolve(host, port):
+            sock = socket.socket(family, socktype, proto)
+            try:
+                sock.settimeout(HTTP_TIMEOUT)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.connect(address)
+                break
+            except OSError as e:
+                sock.close()
+                error = e
+        else:
+            raise error or OSError(f"No addresses found for {host}")
+
+        if secure:
+            with self.lock:
+                if self.context is None:
+                    # Same certificate handling as the stages' own connections (cert_reqs=CERT_NONE)
+                    self.context = ssl.create_default_context()
+                    self.context.check_hostname = False
+                    self.context.verify_mode = ssl.CERT_NONE
+                session = self.sessions.get((host, port))
+            try:
+                sock = self.context.wrap_socket(sock, server_hostname=host, session=session)
+            except ValueError:
+                sock.close()
+                if session is None:
+                    raise
+                # The stored session cannot be resumed with this context; reconnect with a full handshake
+                with self.lock:
+                    self.sessions.pop((host, port), None)
+                return self.open(url)
+            except Exception:
+                sock.close()
+                raise
+            self.remember_session(url, sock)
+        sock.settimeout(None)
+        return sock
+
+    def remember_session(self, url, sock):
+        """Keep sock's TLS session so the next connection to the host can resume it
+
+        Only sockets opened by the pool qualify: a session can only be
+        resumed by the SSLContext that created it.
+        """
+        session = getattr(sock, "session", None)
+        if session is not None and self.context is not None and getattr(sock, "context", None) is self.context:
+            with self.lock:
+                self.sessions[self.endpoint(url)[:2]] = session
+
+    def alive(self, sock):
+        """True if an idle connection has not been closed by the server"""
+        import select
+        import ssl
+
+        if not select.select([sock], [], [], 0)[0]:
+            return True
+        # Readable while idle: either a TLS 1.3 session ticket, or the server closed the connection
+        sock.setblocking(False)
+        try:
+            sock.recv(1)
+            return False
+        except (ssl.SSLWantReadError, BlockingIOError):
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.settimeout(None)
+
+    def warm(self, url, count=None):
+        """Open connections to url's host in the background until count are idle (at most WS_WARM_POOL_SIZE)"""
+        count = WS_WARM_POOL_SIZE if count is None else min(count, WS_WARM_POOL_SIZE)
+        key = self.endpoint(url)[:2]
+        with self.lock:
+            self.active = True
+            missing = count - len(self.idle.get(key, [])) - self.opening.get(key, 0)
+            if missing <= 0:
+                return
+            self.opening[key] = self.opening.get(key, 0) + missing
+        for _ in range(missing):
+            threading.Thread(target=self.fill, args=(url, key), name="ws-warm", daemon=True).start()
+
+    def fill(self, url, key):
+        try:
+            sock = self.open(url)
+        except Exception as e:
+            logger.debug(f"Could not pre-open a connection to {url}: {str(e)}")
+            sock = None
+        with self.lock:
+            self.opening[key] -= 1
+            if sock is not None and self.active:
+                self.idle.setdefault(key, []).append((sock, time.monotonic()))
+                return
+        if sock is not None:
+            sock.close()
+
+    def acquire(self, url):
+        """Take a warm connection to url's host, or open one now
+
+        Returns None when pooling is disabled, leaving the stage to dial by
+        itself. While the pool is active, every connection taken is
+        replaced in the background.
+        """
+        if WS_WARM_POOL_SIZE <= 0:
+            return None
+        key = self.endpoint(url)[:2]
+        sock = None
+        while sock is None:
+            with self.lock:
+                idle = self.idle.get(key)
+                if not idle:
+                    break
+                candidate, opened_at = idle.pop()
+            if time.monotonic() - opened_at < WS_WARM_MAX_IDLE and self.alive(candidate):
+                sock = candidate
+            else:
+                candidate.close()
+
+        if self.active:
+            self.warm(url)
+        if sock is not None:
+            logger.debug(f"Using a pre-opened connection to {key[0]}")
+            return sock
+        return self.open(url)
+
+    def close(self):
+        """Close idle connections and stop refilling until warm() is called again"""
+        with self.lock:
+            self.active = False
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for sock, _ in connections:
+                sock.close()
+
+
+WS_CONNECTIONS = WarmConnectionPool()
+
+def run_websocket_stage(url, message, step_name, on_message, timeout=None):
+    """Run a WebSocket stage until the server closes the connection
+
+    The connection is kept alive with ping/pong heartbeats and is closed
+    early when the stage deadline passes, no message arrives within
+    WS_IDLE_TIMEOUT, or the job is cancelled. A connection that fails
+    before the request was sent is reopened with backoff, since the server
+    cannot have acted on it yet. Once the request is out it is never sent
+    again. Returns None on a normal close, otherwise the reason the stage
+    was stopped.
+    """
+    import ssl
+    import websocket
+
+    raise_if_cancelled(step_name)
+
+    timeout = timeout if timeout is not None else STAGE_TIMEOUTS.get(step_name)
+    breaker = CIRCUIT_BREAKERS["alai"]
+    started_at = time.monotonic()
+    last_activity = [started_at]
+    received_any = [False]
+    request_sent = [False]
+    connection_error = [None]
+    stop_reason = [None]
+    ssl_options = {"cert_reqs": ssl.CERT_NONE}
+
+    def handle_open(ws):
+        try:
+            WS_CONNECTIONS.remember_session(url, ws.sock.sock)
+            ws.send(json.dumps(message))
+            request_sent[0] = True
+        except Exception as e:
+            logger.error(f"Error sending {step_name} request: {str(e)}")
+            add_response(f"{step_name}_error", None, False, f"on_open error: {str(e)}")
+            connection_error[0] = e
+            # Shut the socket down so run_forever ends now instead of idling until WS_IDLE_TIMEOUT
+            ws.keep_running = False
+            try:
+                ws.sock.sock.shutdown(socket.SHUT_RDWR)
+            except (AttributeError, OSError):
+                ws.close()
+
+    def handle_message(ws, msg):
+        last_activity[0] = time.monotonic()
+        received_any[0] = True
+        on_message(ws, msg)
+
+    def handle_error(ws, error):
+        if not received_any[0] and connection_error[0] is None:
+            connection_error[0] = error
+        logger.error(f"WebSocket error in {step_name}: {str(error)}")
+        add_response(f"{step_name}_error", None, False, f"WebSocket error: {str(error)}")
+
+    for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+        trial = breaker.before_call()
+        try:
+            get_rate_limiter("alai:ws").acquire()
+            request_sent[0] = False
+            connection_error[0] = None
+            last_activity[0] = time.monotonic()
+            finished = threading.Event()
+
+            try:
+                prepared_socket = WS_CONNECTIONS.acquire(url)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not open a connection for {step_name}, letting the client dial: {str(e)}")
+                prepared_socket = None
+
+            ws = websocket.WebSocketApp(
+                url,
+                on_open=handle_open,
+                on_message=handle_message,
+                on_error=handle_error,
+                socket=prepared_socket
+            )
+
+            def watchdog():
+                while not finished.wait(0.5):
+                    now = time.monotonic()
+                    if CANCEL_EVENT.is_set():
+                        stop_reason[0] = "cancelled"
+                    elif timeout and now - started_at > timeout:
+                        stop_reason[0] = f"deadline of {timeout:.0f}s exceeded"
+                    elif WS_IDLE_TIMEOUT and now - last_activity[0] > WS_IDLE_TIMEOUT:
+                        stop_reason[0] = f"no message for {WS_IDLE_TIMEOUT:.0f}s"
+                    else:
+                        continue
+                    ws.keep_running = False
+                    sock = ws.sock
+                    if sock is not None and sock.sock is not None:
+                        # Unblocks a stalled handshake or recv, which ws.close() alone does not.
+                        # run_forever closes the socket once it sees the EOF; closing it here
+                        # instead would leave its select() waiting on a dead descriptor.
+                        try:
+                            sock.sock.shutdown(socket.SHUT_RDWR)
+                            return
+                        except OSError:
+                            pass
+                    ws.close()
+                    return
+
+            watchdog_thread = threading.Thread(target=watchdog, name=f"{step_name}-watchdog", daemon=True)
+            watchdog_thread.start()
+            try:
+                with profile_stage(step_name):
+                    ws.run_forever(
+                        sslopt=ssl_options,
+                        ping_interval=WS_PING_INTERVAL,
+                        ping_timeout=WS_PING_TIMEOUT
+                    )
+            finally:
+                finished.set()
+                watchdog_thread.join()
+        except BaseException:
+            if trial:
+                breaker.release_trial()
+            raise
+
+        if stop_reason[0] or received_any[0] or connection_error[0] is None:
+            if received_any[0]:
+                breaker.record_success()
+            elif stop_reason[0] == "cancelled":
+                if trial:
+                    breaker.release_trial()
+            else:
+                # Stalled or closed before answering: as much a failure as a refused connection
+                breaker.record_failure()
+            break
+        breaker.record_failure()
+        if request_sent[0]:
+            # The server may already be acting on the request; resending it could duplicate slides
+            stop_reason[0] = f"connection lost after the request was sent: {str(connection_error[0])}"
+            break
+        if attempt == RETRY_MAX_ATTEMPTS:
+            stop_reason[0] = f"connection failed: {str(connection_error[0])}"
+            break
+        wait_before_retry(step_name, attempt, backoff_delay(attempt))
+
+    if stop_reason[0]:
+        logger.error(f"{step_name} stopped: {stop_reason[0]}")
+        add_response(f"{step_name}_error", None, False, f"Stopped: {stop_reason[0]}")
+    raise_if_cancelled(step_name)
+    return stop_reason[0]
+
 def save_token(token):
     with open("auth_token.txt", "w") as f:
         f.write(token)
@@ -250,7 +1683,7 @@ def authenticated(access_token):
     }
 
     try:
-        response = requests.get(f"{AUTH_URL}/user", headers=headers)
+        response = request_with_retry("GET", f"{AUTH_URL}/user", upstream="alai", step_name="authenticated_check", headers=headers)
         response_data = response.json() if response.content else {}
         if response.status_code == 200:
             if response_data["aud"] == "authenticated":
@@ -287,7 +1720,10 @@ def authenticate():
     }
     
     try:
-        response = requests.post(f"{AUTH_URL}//token?grant_type=password", headers=headers, json=data)
+        response = request_with_retry(
+            "POST", f"{AUTH_URL}//token?grant_type=password", upstream="alai", step_name="authentication",
+            headers=headers, json=data
+        )
         response_data = response.json() if response.content else {}
         
         if response.status_code == 200:
@@ -317,7 +1753,10 @@ def get_existing_presentations():
     }
     
     try:
-        response = requests.get(f"{BASE_API_URL}/get-presentations-list", headers=headers)
+        response = request_with_retry(
+            "GET", f"{BASE_API_URL}/get-presentations-list", upstream="alai", step_name="get_existing_presentations",
+            headers=headers
+        )
         response_data = response.json() if response.content else {}
         
         if response.status_code == 200:
@@ -344,6 +1783,22 @@ def generate_unique_id(existing_ids):
         if new_id not in existing_ids:
             return new_id
 
+def presentation_exists(presentation_id):
+    """Check whether a presentation with the given ID exists"""
+    headers = {
+        "Authorization": f"Bearer {AUTH_TOKEN}"
+    }
+
+    try:
+        response = request_with_retry(
+            "GET", f"{BASE_API_URL}/get-presentation/{presentation_id}", upstream="alai",
+            step_name="presentation_exists", headers=headers
+        )
+        return response.status_code == 200
+    except Exception as e:
+        logger.error(f"Exception checking presentation {presentation_id}: {str(e)}")
+        return False
+
 def create_new_presentation():
     """Create a new presentation with generated ID"""
     global PRESENTATION_ID
@@ -366,9 +1821,20 @@ def create_new_presentation():
     }
     
     try:
-        response = requests.post(f"{BASE_API_URL}/create-new-presentation", headers=headers, json=data)
+        # The presentation ID is chosen client-side, so a retry re-sends the same
+        # ID and can never create a second presentation.
+        response = request_with_retry(
+            "POST", f"{BASE_API_URL}/create-new-presentation", upstream="alai",
+            step_name="create_new_presentation", headers=headers, json=data
+        )
         response_data = response.json() if response.content else {}
         
+        if response.status_code != 200 and presentation_exists(PRESENTATION_ID):
+            logger.info(f"Presentation {PRESENTATION_ID} was created by an earlier attempt")
+            response_data = {"presentation_id": PRESENTATION_ID}
+            add_response("create_new_presentation", response_data)
+            return response_data
+
         if response.status_code == 200:
             logger.info(f"Created new presentation with ID: {PRESENTATION_ID}")
             add_response("create_new_presentation", response_data)
@@ -396,7 +1862,10 @@ def get_presentation_details():
     }
     
     try:
-        response = requests.get(f"{BASE_API_URL}/get-presentation/{PRESENTATION_ID}", headers=headers)
+        response = request_with_retry(
+            "GET", f"{BASE_API_URL}/get-presentation/{PRESENTATION_ID}", upstream="alai", step_name="get_presentation_details",
+            headers=headers
+        )
         response_data = response.json() if response.content else {}
         
         if response.status_code == 200:
@@ -431,7 +1900,10 @@ def get_presentation_questions():
     }
     
     try:
-        response = requests.get(f"{BASE_API_URL}/get-presentation-questions/{PRESENTATION_ID}", headers=headers)
+        response = request_with_retry(
+            "GET", f"{BASE_API_URL}/get-presentation-questions/{PRESENTATION_ID}", upstream="alai",
+            step_name="get_presentation_questions", headers=headers
+        )
         response_data = response.json() if response.content else {}
         
         if response.status_code == 200:
@@ -451,7 +1923,7 @@ def get_presentation_questions():
         return []
 
 
-def generate_slides_outline(content_data, instructions):
+def generate_slides_outline(content_data, instructions, slide_count=DEFAULT_SLIDE_COUNT):
     """Generate slide outlines using WebSocket connection"""
     global SLIDES_DATA
 
@@ -466,17 +1938,13 @@ def generate_slides_outline(content_data, instructions):
         "slide_order": 0,
         "raw_context": content_data,
         "presentation_instructions": instructions,
-        "slide_range": "2-5",
+        "slide_range": f"{min(2, slide_count)}-{slide_count}",
         "presentation_questions": presentation_questions
     }
     
     add_response("generate_slides_outline_request", message)
     
     response_received = False
-    ssl_options = {"cert_reqs": ssl.CERT_NONE}
-    
-    def on_open(ws):
-        ws.send(json.dumps(message))
     
     def on_message(ws, msg):
         nonlocal response_received
@@ -490,18 +1958,14 @@ def generate_slides_outline(content_data, instructions):
         except json.JSONDecodeError as e:
             add_response("generate_slides_outline_response", None, False, str(e))
     
-    def on_error(ws, error):
-        add_response("generate_slides_outline_error", None, False, str(error))
-    
     logger.info("Generating slides outline via WebSocket")
-    ws = websocket.WebSocketApp(
-        "wss://alai-standalone-backend.getalai.com/ws/generate-slides-outline",
-        on_open=on_open,
-        on_message=on_message,
-        on_error=on_error
-    )
-    
-    ws.run_forever(sslopt=ssl_options)
+    if run_websocket_stage(
+        f"{ALAI_WS_URL}/ws/generate-slides-outline",
+        message,
+        "generate_slides_outline",
+        on_message
+    ):
+        return None
     return SLIDES_DATA if response_received else None
 
 def get_calibration_sample_text(content_data):
@@ -519,7 +1983,10 @@ def get_calibration_sample_text(content_data):
     }
     
     try:
-        response = requests.post(f"{BASE_API_URL}/get-calibration-sample-text", headers=headers, json=data)
+        response = request_with_retry(
+            "POST", f"{BASE_API_URL}/get-calibration-sample-text", upstream="alai",
+            step_name="get_calibration_sample_text", headers=headers, json=data
+        )
         response_data = response.json() if response.content else {}
         
         if response.status_code == 200:
@@ -535,8 +2002,26 @@ def get_calibration_sample_text(content_data):
         add_response("get_calibration_sample_text", None, False, error_msg)
         return None
 
-def create_slides_from_outlines(content_data, instructions):
-    """Create actual slides from outlines using WebSocket connection"""
+def extract_created_slides(response_data):
+    """Return the slide entities carried by a create-slides-from-outlines message"""
+    if not isinstance(response_data, dict):
+        return []
+    if isinstance(response_data.get("slides"), list):
+        candidates = response_data["slides"]
+    else:
+        candidates = [response_data]
+    return [
+        slide for slide in candidates
+        if isinstance(slide, dict) and slide.get("id") and slide.get("slide_outline")
+    ]
+
+def create_slides_from_outlines(content_data, instructions, on_slide=None):
+    """Create actual slides from outlines using WebSocket connection
+
+    If on_slide is given it is called once per slide as soon as the slide
+    appears in the stream, so variant generation can start before the
+    whole deck has been created.
+    """
     message = {
         "auth_token": AUTH_TOKEN,
         "presentation_id": PRESENTATION_ID,
@@ -551,10 +2036,7 @@ def create_slides_from_outlines(content_data, instructions):
     add_response("create_slides_from_outlines_request", message)
     
     response_messages = []
-    ssl_options = {"cert_reqs": ssl.CERT_NONE}
-    
-    def on_open(ws):
-        ws.send(json.dumps(message))
+    dispatched_slide_ids = set()
     
     def on_message(ws, msg):
         try:
@@ -563,19 +2045,27 @@ def create_slides_from_outlines(content_data, instructions):
             add_response("create_slides_from_outlines_response", response_data)
         except json.JSONDecodeError as e:
             add_response("create_slides_from_outlines_response", None, False, str(e))
-    
-    def on_error(ws, error):
-        add_response("create_slides_from_outlines_error", None, False, str(error))
+            return
+
+        if on_slide is None:
+            return
+        for slide in extract_created_slides(response_data):
+            if slide["id"] in dispatched_slide_ids:
+                continue
+            dispatched_slide_ids.add(slide["id"])
+            try:
+                on_slide(slide)
+            except Exception as e:
+                logger.error(f"Failed to dispatch slide {slide['id']}: {str(e)}")
     
     logger.info("Creating slides from outlines via WebSocket")
-    ws = websocket.WebSocketApp(
-        "wss://alai-standalone-backend.getalai.com/ws/create-slides-from-outlines",
-        on_open=on_open,
-        on_message=on_message,
-        on_error=on_error
-    )
-    
-    ws.run_forever(sslopt=ssl_options)
+    if run_websocket_stage(
+        f"{ALAI_WS_URL}/ws/create-slides-from-outlines",
+        message,
+        "create_slides_from_outlines",
+        on_message
+    ):
+        return None
     return response_messages if response_messages else None
 
 def generate_shareable_link():
@@ -592,8 +2082,11 @@ def generate_shareable_link():
     }
     
     try:
-        response = requests.post(
+        response = request_with_retry(
+            "POST",
             f"{BASE_API_URL}/upsert-presentation-share",
+            upstream="alai",
+            step_name="generate_shareable_link",
             headers=headers,
             json=data
         )
@@ -619,15 +2112,10 @@ def generate_shareable_link():
         add_response("generate_shareable_link", None, False, error_msg)
         return None
 
-def upload_images_to_presentation(image_paths):
-    logger.info("Uploading images to presentation")
-    
-    headers = {
-        "Authorization": f"Bearer {AUTH_TOKEN}",
-    }
-
+def select_upload_images(image_paths, limit=DEFAULT_SLIDE_COUNT):
+    """Return the image files that will actually be uploaded (one per slide at most)"""
     valid_images = []
-    for path in image_paths:
+    for path in image_paths or []:
         if not os.path.isfile(path):
             logger.warning(f"File not found: {path}")
             continue
@@ -636,12 +2124,34 @@ def upload_images_to_presentation(image_paths):
             valid_images.append(path)
         else:
             logger.warning(f"Skipping non-JPG file: {path}")
-    
-    valid_images = valid_images[:5]
+
+    return valid_images[:limit]
+
+def upload_images_to_presentation(image_paths, limit=DEFAULT_SLIDE_COUNT):
+    """Upload up to limit images, UPLOAD_BATCH_SIZE per request with the batches in parallel"""
+    valid_images = select_upload_images(image_paths, limit)
     if not valid_images:
         logger.warning("No valid JPG images to upload")
         return None
 
+    batches = [valid_images[i:i + UPLOAD_BATCH_SIZE] for i in range(0, len(valid_images), UPLOAD_BATCH_SIZE)]
+    if len(batches) == 1:
+        return upload_image_batch(batches[0])
+
+    logger.info(f"Uploading {len(valid_images)} images in {len(batches)} batches")
+    with ThreadPoolExecutor(max_workers=min(len(batches), SLIDE_VARIANT_WORKERS)) as executor:
+        results = list(executor.map(upload_image_batch, batches))
+
+    images = [image for result in results if result for image in result.get("images", [])]
+    return {"images": images} if images else None
+
+def upload_image_batch(valid_images):
+    logger.info("Uploading images to presentation")
+    
+    headers = {
+        "Authorization": f"Bearer {AUTH_TOKEN}",
+    }
+
     files = [
         ('upload_input', (None, json.dumps({'presentation_id': PRESENTATION_ID}), 'application/json')),
     ]
@@ -653,8 +2163,12 @@ def upload_images_to_presentation(image_paths):
     
     logger.debug(f"Preparing to upload {len(files)} images")
     try:
-        response = requests.post(
+        response = request_with_retry(
+            "POST",
             f"{BASE_API_URL}/upload-images-for-slide-generation",
+            upstream="alai",
+            step_name="upload_images_to_presentation",
+            idempotent=False,
             headers=headers,
             files=files
         )
@@ -681,8 +2195,8 @@ def upload_images_to_presentation(image_paths):
             if len(file_tuple) > 1 and hasattr(file_tuple[1], 'close'):
                 file_tuple[1].close()
 
-def add_images_to_existing_slides(images_data, slides_data):
-    """Add images to existing slides starting from first slide"""
+def add_images_to_existing_slides(images_data, slides_data, limit=DEFAULT_SLIDE_COUNT):
+    """Add images to existing slides starting from first slide, one image per slide"""
     if not images_data or not slides_data:
         return slides_data
     
@@ -695,7 +2209,7 @@ def add_images_to_existing_slides(images_data, slides_data):
             logger.error("Invalid slides_data format - expected list")
             return slides_data
             
-        for i, image in enumerate(image_list[:5]):
+        for i, image in enumerate(image_list[:limit]):
             if i >= len(slides_data):
                 logger.warning(f"No more slides to add images to (tried to add to slide {i})")
                 break
@@ -713,18 +2227,49 @@ def add_images_to_existing_slides(images_data, slides_data):
         logger.error(f"Error adding images to slides: {str(e)}")
         return slides_data
 
+def split_into_sections(content, count):
+    """Split content into up to count sections of similar size along paragraph boundaries"""
+    paragraphs = [paragraph.strip() for paragraph in content.split("\n\n") if paragraph.strip()]
+    if not paragraphs or count <= 0:
+        return []
+
+    target = max(1, sum(len(paragraph) for paragraph in paragraphs) // count)
+    sections = []
+    current = []
+    current_size = 0
+    for paragraph in paragraphs:
+        current.append(paragraph)
+        current_size += len(paragraph)
+        if current_size >= target and len(sections) < count - 1:
+            sections.append("\n\n".join(current))
+            current, current_size = [], 0
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+def section_for_slide(slide_outline, sections):
+    """Pick the source section sharing the most words with the slide's title and context"""
+    words = lambda text: set(re.findall(r'[a-z0-9]{4,}', text.lower()))
+    slide_words = words(f"{slide_outline.get('slide_title', '')} {slide_outline.get('slide_context', '')}")
+    return max(sections, key=lambda section: len(slide_words & words(section)))
+
 def create_and_stream_slide_variants(slide_data):
     """Create and stream slide variants using WebSocket connection"""
     logger.info(f"Creating and streaming slide variants for slide {slide_data['id']}")
     
     images_on_slide = slide_data["slide_outline"].get("images_on_slide", [])
     logger.debug(f"Images on slide: {images_on_slide}")
+
+    slide_context = slide_data["slide_outline"]["slide_context"]
+    if SECTION_CONTEXTS:
+        section = section_for_slide(slide_data["slide_outline"], SECTION_CONTEXTS)
+        slide_context = f"{slide_context}\n\nSource material:\n{section[:SLIDE_CONTEXT_CHARS]}"
     
     message = {
         "auth_token": AUTH_TOKEN,
         "presentation_id": PRESENTATION_ID,
         "slide_id": slide_data["id"],
-        "slide_specific_context": slide_data["slide_outline"]["slide_context"],
+        "slide_specific_context": slide_context,
         "images_on_slide": images_on_slide,
         "additional_instructions": slide_data["slide_outline"]["slide_instructions"],
         "layout_type": "AI_GENERATED_LAYOUT",
@@ -735,15 +2280,6 @@ def create_and_stream_slide_variants(slide_data):
     add_response("create_and_stream_slide_variants_request", message)
 
     response_messages = []
-    ssl_options = {"cert_reqs": ssl.CERT_NONE}
-
-    def on_open(ws):
-        try:
-            logger.debug(f"Sending message to create slide variants for slide {slide_data['id']}")
-            ws.send(json.dumps(message))
-        except Exception as e:
-            logger.error(f"Error in on_open: {str(e)}")
-            add_response("create_and_stream_slide_variants_error", None, False, f"on_open error: {str(e)}")
 
     def on_message(ws, msg):
         try:
@@ -758,18 +2294,16 @@ def create_and_stream_slide_variants(slide_data):
             logger.error(f"Error in on_message: {str(e)}")
             add_response("create_and_stream_slide_variants_response", None, False, f"Error in on_message: {str(e)}")
 
-    def on_error(ws, error):
-        logger.error(f"WebSocket error: {str(error)}")
-        add_response("create_and_stream_slide_variants_error", None, False, f"WebSocket error: {str(error)}")
-
     try:
-        ws = websocket.WebSocketApp(
-            "wss://alai-standalone-backend.getalai.com/ws/create-and-stream-slide-variants",
-            on_open=on_open,
-            on_message=on_message,
-            on_error=on_error
-        )
-        ws.run_forever(sslopt=ssl_options)
+        if run_websocket_stage(
+            f"{ALAI_WS_URL}/ws/create-and-stream-slide-variants",
+            message,
+            "create_and_stream_slide_variants",
+            on_message
+        ):
+            return None
+    except PresentationCancelled:
+        raise
     except Exception as e:
         logger.error(f"WebSocket connection failed: {str(e)}")
         add_response("create_and_stream_slide_variants_error", None, False, f"WebSocket connection failed: {str(e)}")
@@ -796,8 +2330,11 @@ def set_active_variant(slide_id, variant_id):
     }
     
     try:
-        response = requests.post(
+        response = request_with_retry(
+            "POST",
             f"{BASE_API_URL}/set-active-variant",
+            upstream="alai",
+            step_name="set_active_variant",
             headers=headers,
             json=data
         )
@@ -831,8 +2368,11 @@ def update_slide_entity(slide_data, variant_id):
     slide_data["active_variant_id"] = variant_id
     
     try:
-        response = requests.post(
+        response = request_with_retry(
+            "POST",
             f"{BASE_API_URL}/update-slide-entity",
+            upstream="alai",
+            step_name="update_slide_entity",
             headers=headers,
             json=slide_data
         )
@@ -854,96 +2394,243 @@ def update_slide_entity(slide_data, variant_id):
         add_response("update_slide_entity", None, False, error_msg)
         return None
 
-def process_slide_variants(slides_data):
-    """Process each slide to create variants, set active variant, and update slide entity"""
-    if not slides_data or "slides" not in slides_data[0]:
-        logger.error("No slides data found to process variants")
-        return False
-    
-    presentation_slides = slides_data[0]["slides"]
-    sorted_slides = sorted(presentation_slides, key=lambda x: x["slide_order"])
-    
-    for slide in sorted_slides:
-        logger.info(f"Processing slide {slide['slide_order']}: {slide['slide_outline']['slide_title']}")
-        
-        variant_responses = create_and_stream_slide_variants(slide)
-        if not variant_responses or len(variant_responses) < 2:
+def process_single_slide_variant(slide):
+    """Create variants for one slide, set the active variant and update the slide entity"""
+    with profile_stage("variants"):
+        raise_if_cancelled(f"processing slide {slide['id']}")
+        logger.info(f"Processing slide {slide.get('slide_order')}: {slide['slide_outline'].get('slide_title')}")
+
+        for attempt in range(1, SLIDE_VARIANT_ATTEMPTS + 1):
+            variant_responses = create_and_stream_slide_variants(slide)
+            if variant_responses and len(variant_responses) >= 2:
+                break
+            if attempt < SLIDE_VARIANT_ATTEMPTS:
+                wait_before_retry(f"create_and_stream_slide_variants for slide {slide['id']}", attempt, backoff_delay(attempt))
+        else:
             logger.error(f"Failed to get variant responses for slide {slide['id']}")
-            continue
-        
+            return False
+
         slide_entity_data = variant_responses[0]
-        
-        if len(variant_responses) >= 2 and "id" in variant_responses[1]:
-            variant_id = variant_responses[1]["id"]
-            
-            set_active_variant_result = set_active_variant(slide["id"], variant_id)
-            if not set_active_variant_result:
-                continue
-            
-            update_slide_entity(slide_entity_data, variant_id)
-        else:
+
+        if "id" not in variant_responses[1]:
             logger.error(f"No variant ID found in responses for slide {slide['id']}")
-    
-    return True
+            return False
 
+        variant_id = variant_responses[1]["id"]
 
-def generate_presentation(content_data, instructions="", image_paths=None):
-    """Main function to orchestrate the entire presentation generation process"""
-    global AUTH_TOKEN
+        set_active_variant_result = set_active_variant(slide["id"], variant_id)
+        if not set_active_variant_result:
+            return False
 
-    content_data = content_data[:19000]
-    
-    add_response("start", {
-        "content_data": content_data[:200] + "..." if len(content_data) > 200 else content_data,
-        "instructions": instructions,
-        "image_paths": image_paths if image_paths else []
-    })
+        return update_slide_entity(slide_entity_data, variant_id) is not None
+
+def pending_variant_slides(slides_data, skip_slide_ids=None):
+    """Slides whose variants were not started from the stream, in slide order, or None without slides data"""
+    if not slides_data or "slides" not in slides_data[0]:
+        logger.error("No slides data found to process variants")
+        return None
     
+    skip_slide_ids = skip_slide_ids or set()
+    presentation_slides = slides_data[0]["slides"]
+    sorted_slides = sorted(presentation_slides, key=lambda x: x["slide_order"])
+    return [slide for slide in sorted_slides if slide["id"] not in skip_slide_ids]
+
+
+def result_cache_key(content_data, instructions, image_paths, slide_count=DEFAULT_SLIDE_COUNT):
+    """Hash the cleaned content, instructions, deck size and selected image bytes into a cache key"""
+    digest = hashlib.sha256()
+    digest.update(content_data.encode('utf-8'))
+    digest.update(b"\0")
+    digest.update((instructions or "").encode('utf-8'))
+    if slide_count != DEFAULT_SLIDE_COUNT:
+        digest.update(f"\0slides={slide_count}".encode('utf-8'))
+    for path in select_upload_images(image_paths, slide_count):
+        with open(path, 'rb') as f:
+            digest.update(b"\0" + hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def load_result_cache():
+    if not os.path.exists(RESULT_CACHE_FILE):
+        return {}
     try:
-        access_token = load_token()
-        if not authenticated(access_token):
-            if not authenticate():
-                logger.error("Authentication failed")
-                return False
+        with open(RESULT_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable result cache {RESULT_CACHE_FILE}: {str(e)}")
+        return {}
+
+def get_cached_result(cache_key, ttl=None):
+    """Return the cached presentation for cache_key, or None if missing or expired"""
+    ttl = RESULT_CACHE_TTL if ttl is None else ttl
+    if ttl <= 0:
+        return None
+    with RESULT_CACHE_LOCK:
+        entry = load_result_cache().get(cache_key)
+    if not entry or time.time() - entry.get("created_at", 0) > ttl:
+        return None
+    return entry
+
+def store_cached_result(cache_key, presentation_id, shareable_link, ttl=None):
+    """Record a generated presentation and drop expired entries"""
+    ttl = RESULT_CACHE_TTL if ttl is None else ttl
+    if ttl <= 0:
+        return
+    now = time.time()
+    # The thread lock serializes this process; the file lock serializes service workers
+    with RESULT_CACHE_LOCK, file_lock(f"{RESULT_CACHE_FILE}.lock"):
+        cache = {
+            key: entry for key, entry in load_result_cache().items()
+            if now - entry.get("created_at", 0) <= ttl
+        }
+        cache[cache_key] = {
+            "presentation_id": presentation_id,
+            "shareable_link": shareable_link,
+            "created_at": now
+        }
+        tmp_filename = f"{RESULT_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_filename, 'w') as f:
+            json.dump(cache, f, indent=4)
+        os.replace(tmp_filename, RESULT_CACHE_FILE)
+
+def generate_presentation(content_data, instructions="", image_paths=None, timeout=None,
+                          force=False, cache_ttl=None, slide_count=None, profile=False):
+    """Main function to orchestrate the entire presentation generation process
+
+    The whole job is cancelled once timeout seconds (PRESENTATION_TIMEOUT by
+    default) have elapsed, or when cancel_presentation() is called. Called
+    from run_pipeline, the pipeline's deadline (which includes scraping)
+    applies instead.
+    Unless force is set, a presentation already generated from the same
+    content, instructions and images within cache_ttl seconds is returned
+    from the result cache instead of being generated again.
+    Decks larger than DEFAULT_SLIDE_COUNT give every slide its own section
+    of the full source content, not just the shared truncated context.
+    With profile set, per-stage cProfile stats and allocation reports are
+    written to a .profile directory next to the run journal.
+    """
+    global AUTH_TOKEN, AUTH_VERIFIED_AT, PRESENTATION_ID, SECTION_CONTEXTS
+
+    initialize()
+    slide_count = slide_count or SLIDE_COUNT
+    full_content = content_data
+    content_data = content_data[:19000]
+    SECTION_CONTEXTS = split_into_sections(full_content, slide_count) if slide_count > DEFAULT_SLIDE_COUNT else []
+
+    owns_deadline = start_deadline(timeout)
+    owns_profiler = profile and start_profiling()
+    try:
+        cache_key = result_cache_key(full_content, instructions, image_paths, slide_count)
+        cached = None if force else get_cached_result(cache_key, cache_ttl)
+        if cached:
+            PRESENTATION_ID = cached["presentation_id"]
+            logger.info(f"Reusing cached presentation {PRESENTATION_ID} for unchanged content")
+            add_response("result_cache_hit", cached)
+            return cached["shareable_link"]
+
+        add_response("start", {
+            "content_data": content_data[:200] + "..." if len(content_data) > 200 else content_data,
+            "instructions": instructions,
+            "image_paths": image_paths if image_paths else [],
+            "slide_count": slide_count
+        })
+
+        if AUTH_TOKEN and AUTH_VERIFIED_AT and time.monotonic() - AUTH_VERIFIED_AT < AUTH_RECHECK_INTERVAL:
+            logger.info("Using recently verified authentication token")
         else:
-            AUTH_TOKEN = access_token
-            logger.info("Using existing authentication token")
+            access_token = load_token()
+            if not authenticated(access_token):
+                if not authenticate():
+                    logger.error("Authentication failed")
+                    return False
+            else:
+                AUTH_TOKEN = access_token
+                logger.info("Using existing authentication token")
+            AUTH_VERIFIED_AT = time.monotonic()
             
+        # The outline stage is next on the WebSocket host; connect while the REST calls run
+        WS_CONNECTIONS.warm(ALAI_WS_URL, 1)
+
+        raise_if_cancelled("create_new_presentation")
         presentation_data = create_new_presentation()
         if not presentation_data:
             return False
         
+        raise_if_cancelled("get_presentation_details")
         presentation_details = get_presentation_details()
         if not presentation_details:
             return False
         
-        slides_data = generate_slides_outline(content_data, instructions)
+        raise_if_cancelled("generate_slides_outline")
+        slides_data = generate_slides_outline(content_data, instructions, slide_count)
         if not slides_data:
             return False
+
+        # Slide creation and the first slide variants connect right after the image upload and calibration
+        WS_CONNECTIONS.warm(ALAI_WS_URL)
         
+        images_data = None
         if image_paths:
             logger.info(f"Attempting to upload {len(image_paths)} images")
-            images_data = upload_images_to_presentation(image_paths)
+            with profile_stage("image_upload"):
+                images_data = upload_images_to_presentation(image_paths, slide_count)
             if images_data:
                 logger.info("Adding images to slides")
-                slides_data = add_images_to_existing_slides(images_data, slides_data)
+                slides_data = add_images_to_existing_slides(images_data, slides_data, slide_count)
             else:
                 logger.warning("Image upload failed or no images returned")
         
+        raise_if_cancelled("get_calibration_sample_text")
         calibration_data = get_calibration_sample_text(content_data)
         if not calibration_data:
             logger.warning("Failed to get calibration sample text")
         
         logger.info("Creating slides from outlines")
-        slides_creation_responses = create_slides_from_outlines(content_data, instructions)
+        variant_futures = {}
+        variants_ok = True
+        with ThreadPoolExecutor(max_workers=SLIDE_VARIANT_WORKERS) as variant_executor:
+            def start_slide_variants(slide):
+                logger.info(f"Slide {slide['id']} created, starting variant generation")
+                variant_futures[slide["id"]] = variant_executor.submit(process_single_slide_variant, slide)
+
+            slides_creation_responses = create_slides_from_outlines(
+                content_data, instructions, on_slide=start_slide_variants
+            )
+
+            if not slides_creation_responses:
+                # The job fails without slides; don't let started variants run out their stage timeouts
+                running = [future for future in variant_futures.values() if not future.cancel()]
+                if any(not future.done() for future in running):
+                    cancel_presentation("slide creation failed")
+            elif not variant_futures or "slides" in slides_creation_responses[0]:
+                remaining_slides = pending_variant_slides(slides_creation_responses, set(variant_futures))
+                if remaining_slides is None:
+                    variants_ok = False
+                elif remaining_slides:
+                    logger.info(f"Processing {len(remaining_slides)} remaining slide variants")
+                    for slide in remaining_slides:
+                        start_slide_variants(slide)
+
+            for future in as_completed(variant_futures.values()):
+                if future.cancelled():
+                    continue
+                try:
+                    if not future.result():
+                        variants_ok = False
+                except PresentationCancelled:
+                    variants_ok = False
+                except Exception as e:
+                    logger.error(f"Error processing slide variants: {str(e)}")
+                    variants_ok = False
+
+        raise_if_cancelled("process_slide_variants")
         if not slides_creation_responses:
             logger.error("Failed to create slides from outlines")
             return False
         
-        logger.info("Processing slide variants")
-        if not process_slide_variants(slides_creation_responses):
+        if not variants_ok:
             logger.warning("Some slide variants may not have processed correctly")
         
+        raise_if_cancelled("generate_shareable_link")
         logger.info("Generating shareable link")
         shareable_link = generate_shareable_link()
         if not shareable_link:
@@ -951,44 +2638,535 @@ def generate_presentation(content_data, instructions="", image_paths=None):
             return False
         
         logger.info("Presentation generation complete")
+        if variants_ok and (images_data or not image_paths):
+            store_cached_result(cache_key, PRESENTATION_ID, shareable_link, cache_ttl)
+        else:
+            logger.warning("Not caching the presentation because some slides or images failed")
         save_responses_to_file()
         return shareable_link
         
+    except PresentationCancelled as e:
+        logger.error(f"Presentation generation cancelled: {str(e)}")
+        add_response("cancelled", None, False, str(e))
+        save_responses_to_file()
+        return False
     except Exception as e:
         logger.error(f"Error in generate_presentation: {str(e)}")
         add_response("error", None, False, str(e))
         save_responses_to_file()
         return False
+    finally:
+        if owns_deadline:
+            stop_deadline()
+        WS_CONNECTIONS.close()
+        if owns_profiler:
+            stop_profiling()
+
+def linked_file_size(path):
+    """Size of path, split evenly between its hard links so shared images are counted once"""
+    stat = os.stat(path)
+    return stat.st_size // max(stat.st_nlink, 1)
+
+def artifact_size(path):
+    if os.path.isfile(path):
+        return linked_file_size(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += linked_file_size(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def artifact_last_used(path):
+    """Newest mtime in an artifact, ignoring hard-linked image store objects
+
+    A hard link shares its inode, so touching a store object would otherwise
+    refresh every scrape directory that links the same image.
+    """
+    if os.path.isfile(path):
+        return os.path.getmtime(path)
+    latest = os.path.getmtime(path)
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            if stat.st_nlink == 1:
+                latest = max(latest, stat.st_mtime)
+    return latest
+
+def list_artifacts():
+    """Every artifact the generator leaves on disk, as dicts with path, kind, size and last_used"""
+    candidates = []
+    if os.path.isdir("scraped_data"):
+        candidates += [("scrape", os.path.join("scraped_data", name)) for name in os.listdir("scraped_data")]
+    candidates += [
+        ("responses", name) for name in os.listdir(".")
+        if name.startswith("presentation_responses_") and name.endswith(".json")
+    ]
+    for root, _, files in os.walk(IMAGE_STORE_DIR):
+        candidates += [("image", os.path.join(root, name)) for name in files]
+    candidates += [
+        ("profile", name) for name in os.listdir(".")
+        if name.startswith("presentation_responses_") and name.endswith(".profile") and os.path.isdir(name)
+    ]
+    log_dir = os.path.dirname(LOG_FILE) or "."
+    log_prefix = os.path.basename(LOG_FILE) + "."
+    candidates += [
+        ("log", os.path.join(log_dir, name)) for name in os.listdir(log_dir)
+        if name.startswith(log_prefix) and name[len(log_prefix):].isdigit()
+    ]
+
+    artifacts = []
+    for kind, path in candidates:
+        try:
+            artifacts.append({
+                "path": path,
+                "kind": kind,
+                "size": artifact_size(path),
+                "last_used": artifact_last_used(path)
+            })
+        except OSError:
+            continue
+    return artifacts
+
+@contextmanager
+def artifact_in_use(path):
+    """Mark a scrape directory as used by the current run so gc never evicts it
+
+    A shared flock on <path>/.inuse is held for the duration of the block;
+    gc in any process skips directories whose .inuse it cannot lock
+    exclusively. Touching .inuse also refreshes the directory's LRU time.
+    """
+    import fcntl
+
+    while True:
+        os.makedirs(path, exist_ok=True)
+        lock_path = os.path.join(path, ".inuse")
+        lock_file = open(lock_path, 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        try:
+            if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                break
+        except OSError:
+            pass
+        # gc removed the directory while we were waiting for the lock
+        lock_file.close()
+
+    try:
+        os.utime(lock_path)
+        yield
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+def remove_artifact(artifact):
+    """Delete an artifact unless a run is using it; returns True if it was removed"""
+    import fcntl
+    import shutil
+
+    if artifact["kind"] == "profile":
+        shutil.rmtree(artifact["path"], ignore_errors=True)
+        return True
+    if artifact["kind"] != "scrape":
+        os.remove(artifact["path"])
+        return True
+
+    lock_path = os.path.join(artifact["path"], ".inuse")
+    with open(lock_path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        shutil.rmtree(artifact["path"], ignore_errors=True)
+        return True
+
+def collect_garbage(max_bytes=None, max_age=None, dry_run=False):
+    """Evict artifacts older than max_age, then least recently used ones until under max_bytes
+
+    Directories in use by a running job are never removed. Returns a
+    summary of what was (or, with dry_run, would be) removed.
+    """
+    max_bytes = STORAGE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = STORAGE_MAX_AGE if max_age is None else max_age
+    now = time.time()
+
+    artifacts = sorted(list_artifacts(), key=lambda artifact: artifact["last_used"])
+    total = sum(artifact["size"] for artifact in artifacts)
+    removed = []
+
+    for artifact in artifacts:
+        expired = max_age > 0 and now - artifact["last_used"] > max_age
+        if not expired and total <= max_bytes:
+            continue
+        try:
+            if not dry_run and not remove_artifact(artifact):
+                logger.info(f"Skipping {artifact['path']}: in use by a running job")
+                continue
+        except OSError as e:
+            logger.warning(f"Failed to remove {artifact['path']}: {str(e)}")
+            continue
+        total -= artifact["size"]
+        removed.append(artifact)
+
+    summary = {
+        "removed": [artifact["path"] for artifact in removed],
+        "freed_bytes": sum(artifact["size"] for artifact in removed),
+        "remaining_bytes": total,
+        "dry_run": dry_run
+    }
+    logger.info(
+        f"Storage gc {'would free' if dry_run else 'freed'} {summary['freed_bytes']} bytes "
+        f"from {len(removed)} artifacts; {total} bytes remain"
+    )
+    return summary
+
+def reset_job_state():
+    """Clear the per-presentation globals so one process can run many jobs"""
+    global PRESENTATION_ID, SLIDE_ID, SECTION_CONTEXTS
+    PRESENTATION_ID = None
+    SLIDE_ID = None
+    SECTION_CONTEXTS = []
+    SLIDES_DATA.clear()
+    ALL_RESPONSES.clear()
+
+def run_pipeline(url, instructions=None, timeout=None, force=False, cache_ttl=None,
+                 crawl=False, max_pages=None, path_prefix=None, slide_count=None, profile=False):
+    """Scrape url (or, with crawl, the site section under it) and turn it into a presentation
+
+    Returns the shareable link or None. The timeout covers the whole job,
+    scraping included. With profile set, the scrape stages are profiled
+    along with the generation stages.
+    """
+    initialize()
+    slide_count = slide_count or SLIDE_COUNT
+    max_images = max(10, slide_count)
+    output_dir = crawl_output_dir(url) if crawl else scrape_output_dir(url)
+    owns_deadline = start_deadline(timeout)
+    owns_profiler = profile and start_profiling()
+    try:
+        with artifact_in_use(output_dir):
+            if crawl:
+                scraped = SCRAPE_FLIGHTS.do(
+                    ("crawl", normalize_url(url), max_pages, path_prefix, slide_count),
+                    crawl_website, url, FIRE_CRAWL_API_KEY, max_pages, path_prefix, max(CRAWL_MAX_IMAGES, slide_count)
+                )
+            else:
+                scraped = scrape_webpage(url, FIRE_CRAWL_API_KEY, max_images)
+            if not isinstance(scraped, tuple):
+                logger.error(f"Failed to scrape {url}: {scraped}")
+                return None
+            content, dir = scraped
+
+            image_dir = f"{dir}/images"
+            image_paths = [os.path.join(image_dir, filename) for filename in sorted(os.listdir(image_dir), key=image_index)
+                      if os.path.isfile(os.path.join(image_dir, filename)) 
+                      and filename.lower().endswith(('.jpg', '.jpeg'))]
+            logger.debug(f"Found image paths: {image_paths}")
+        
+            shareable_link = generate_presentation(
+                content, instructions or build_instructions(slide_count), image_paths,
+                timeout=timeout, force=force, cache_ttl=cache_ttl, slide_count=slide_count
+            )
+    except PresentationCancelled as e:
+        logger.error(f"Presentation job cancelled: {str(e)}")
+        return None
+    finally:
+        if owns_deadline:
+            stop_deadline()
+        if owns_profiler:
+            stop_profiling()
+
+    if STORAGE_GC_AFTER_RUN:
+        try:
+            collect_garbage()
+        except Exception as e:
+            logger.warning(f"Storage gc failed: {str(e)}")
+    return shareable_link or None
+
+def service_worker(job_queue, event_queue, log_queue):
+    """Worker process loop: runs queued jobs one at a time in a warm interpreter
+
+    Log records go to log_queue so that only the parent writes and rotates
+    LOG_FILE; RotatingFileHandler is not safe across processes.
+    """
+    from logging.handlers import QueueHandler
+
+    initialize(setup_logging=False)
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+    while True:
+        job = job_queue.get()
+        if job is None:
+            return
+        event_queue.put(("running", job["id"], os.getpid(), None, None))
+        reset_job_state()
+        try:
+            link = run_pipeline(
+                job["url"], job.get("instructions"),
+                timeout=job.get("timeout"), force=job.get("force", False),
+                crawl=job.get("crawl", False), max_pages=job.get("max_pages"),
+                path_prefix=job.get("path_prefix"), slide_count=job.get("slides")
+            )
+            error = None if link else "Failed to create presentation"
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            link, error = None, str(e)
+        event_queue.put(("done", job["id"], os.getpid(), link, error))
+
+def run_service(host=None, port=None, workers=None, queue_size=None):
+    """Serve deck jobs over HTTP from a bounded queue drained by worker processes
+
+    POST /jobs         {"url": ..., "instructions": ..., "force": ..., "timeout": ..., "coalesce": ...,
+                        "crawl": ..., "max_pages": ..., "path_prefix": ..., "slides": ...}
+    GET  /jobs/<id>    job status and, once finished, its shareable link or error
+    GET  /queue        queue depth, running jobs and capacity
+
+    Workers are supervised: when one dies mid-job (OOM kill, crash) the job
+    it was running is marked failed and a replacement worker is started.
+
+    A job for the same normalized URL and instructions as one that is still
+    queued or running is coalesced into it (unless "coalesce" is false):
+    the existing job is returned and both callers share its result.
+    """
+    initialize()
+    host = host or SERVICE_HOST
+    port = port or SERVICE_PORT
+    workers = workers or SERVICE_WORKERS
+    queue_size = queue_size or SERVICE_QUEUE_SIZE
+
+    import math
+    import multiprocessing
+    import queue
+    from collections import OrderedDict
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from logging.handlers import QueueListener
+
+    log_queue = multiprocessing.Queue()
+    log_listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    log_listener.start()
+    job_queue = multiprocessing.Queue(maxsize=queue_size)
+    # SimpleQueue writes synchronously, so a worker's "running" event survives its crash
+    event_queue = multiprocessing.SimpleQueue()
+    jobs = OrderedDict()
+    in_flight = {}
+    jobs_lock = threading.Lock()
+
+    dead_workers = {}
+    stopping = threading.Event()
+
+    def start_worker():
+        process = multiprocessing.Process(target=service_worker, args=(job_queue, event_queue, log_queue), daemon=True)
+        process.start()
+        return process
+
+    processes = [start_worker() for _ in range(workers)]
+
+    def finish_job(job, link, error):
+        # Caller holds jobs_lock
+        if in_flight.get(job.get("coalesce_key")) == job["id"]:
+            del in_flight[job["coalesce_key"]]
+        job["status"] = "succeeded" if link else "failed"
+        job["shareable_link"] = link
+        job["error"] = error
+        job["finished_at"] = datetime.now().isoformat()
+
+        finished = [jid for jid, j in jobs.items() if j["status"] in ("succeeded", "failed")]
+        for jid in finished[:max(0, len(finished) - SERVICE_JOB_HISTORY)]:
+            del jobs[jid]
+
+    def collect_events():
+        while True:
+            status, job_id, worker_pid, link, error = event_queue.get()
+            with jobs_lock:
+                job = jobs.get(job_id)
+                if job is None or job["status"] in ("succeeded", "failed"):
+                    continue
+                if status == "running" and worker_pid in dead_workers:
+                    # The worker died before the supervisor saw this job start
+                    finish_job(job, None, dead_workers[worker_pid])
+                elif status == "running":
+                    job["status"] = "running"
+                    job["worker_pid"] = worker_pid
+                    job["started_at"] = datetime.now().isoformat()
+                else:
+                    finish_job(job, link, error)
+
+    def supervise_workers():
+        while not stopping.wait(SERVICE_SUPERVISE_INTERVAL):
+            for index, process in enumerate(processes):
+                if process.is_alive() or stopping.is_set():
+                    continue
+                error = f"Worker process {process.pid} exited with code {process.exitcode}"
+                logger.error(f"{error}, starting a replacement")
+                with jobs_lock:
+                    dead_workers[process.pid] = error
+                    for job in list(jobs.values()):
+                        if job["status"] == "running" and job.get("worker_pid") == process.pid:
+                            finish_job(job, None, error)
+                processes[index] = start_worker()
+
+    threading.Thread(target=collect_events, name="service-events", daemon=True).start()
+    threading.Thread(target=supervise_workers, name="service-supervisor", daemon=True).start()
+
+    class JobHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                return self.send_json(404, {"error": "Not found"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self.send_json(400, {"error": "Request body must be JSON"})
+
+            if not isinstance(body, dict):
+                return self.send_json(400, {"error": "Request body must be a JSON object"})
+            url = body.get("url")
+            if not isinstance(url, str) or not url.startswith("http"):
+                return self.send_json(400, {"error": "url must start with http:// or https://"})
+            slides = body.get("slides")
+            if slides is not None and (type(slides) is not int or not 1 <= slides <= MAX_SLIDE_COUNT):
+                return self.send_json(400, {"error": f"slides must be an integer between 1 and {MAX_SLIDE_COUNT}"})
+            max_pages = body.get("max_pages")
+            if max_pages is not None and (type(max_pages) is not int or max_pages < 1):
+                return self.send_json(400, {"error": "max_pages must be a positive integer"})
+            timeout = body.get("timeout")
+            if timeout is not None and (type(timeout) not in (int, float) or not math.isfinite(timeout) or timeout <= 0):
+                return self.send_json(400, {"error": "timeout must be a positive number of seconds"})
+            for field in ("instructions", "path_prefix"):
+                if body.get(field) is not None and not isinstance(body[field], str):
+                    return self.send_json(400, {"error": f"{field} must be a string"})
+            if body.get("path_prefix") is not None and not body["path_prefix"].startswith("/"):
+                return self.send_json(400, {"error": "path_prefix must start with /"})
+            for field in ("force", "crawl", "coalesce"):
+                if field in body and not isinstance(body[field], bool):
+                    return self.send_json(400, {"error": f"{field} must be true or false"})
+
+            job = {
+                "id": str(uuid.uuid4()),
+                "url": url,
+                "instructions": body.get("instructions"),
+                "force": bool(body.get("force", False)),
+                "timeout": timeout,
+                "crawl": bool(body.get("crawl", False)),
+                "max_pages": max_pages,
+                "path_prefix": body.get("path_prefix"),
+                "slides": slides,
+            }
+            coalesce_key = json.dumps([
+                normalize_url(url), job["instructions"] or "", job["crawl"], job["max_pages"], job["path_prefix"],
+                job["slides"]
+            ])
+            with jobs_lock:
+                existing_id = in_flight.get(coalesce_key) if body.get("coalesce", True) else None
+                if existing_id in jobs:
+                    logger.info(f"Coalescing request for {url} into in-flight job {existing_id}")
+                    response = {key: value for key, value in jobs[existing_id].items() if key != "coalesce_key"}
+                    response["coalesced"] = True
+                    return self.send_json(202, response)
+                try:
+                    job_queue.put_nowait(job)
+                except queue.Full:
+                    return self.send_json(503, {"error": "Job queue is full, retry later"})
+                jobs[job["id"]] = {
+                    "id": job["id"],
+                    "url": url,
+                    "status": "queued",
+                    "submitted_at": datetime.now().isoformat(),
+                    "coalesce_key": coalesce_key
+                }
+                in_flight[coalesce_key] = job["id"]
+                response = {key: value for key, value in jobs[job["id"]].items() if key != "coalesce_key"}
+            logger.info(f"Queued job {job['id']} for {url}")
+            self.send_json(202, response)
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path == "/queue":
+                with jobs_lock:
+                    statuses = [job["status"] for job in jobs.values()]
+                return self.send_json(200, {
+                    "queued": statuses.count("queued"),
+                    "running": statuses.count("running"),
+                    "capacity": queue_size,
+                    "workers": workers
+                })
+            if path.startswith("/jobs/"):
+                with jobs_lock:
+                    job = jobs.get(path[len("/jobs/"):])
+                    job = {key: value for key, value in job.items() if key != "coalesce_key"} if job else None
+                if job is None:
+                    return self.send_json(404, {"error": "Unknown job"})
+                return self.send_json(200, job)
+            self.send_json(404, {"error": "Not found"})
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} - {format % args}")
+
+    server = ThreadingHTTPServer((host, port), JobHandler)
+    logger.info(f"Serving on http://{host}:{port} with {workers} workers (queue size {queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down service")
+    finally:
+        stopping.set()
+        server.server_close()
+        for _ in processes:
+            try:
+                job_queue.put_nowait(None)
+            except queue.Full:
+                break
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        log_listener.stop()
 
 if __name__ == "__main__":
+    if not {"-h", "--help"} & set(sys.argv[1:]):
+        # .env values become the option defaults; --help shows the environment's without loading it.
+        # Initializing here also means the pipeline's own initialize() does not read .env again.
+        initialize()
     args = configure_argparse()
     
     if args.debug:
+        import websocket
+
         logger.setLevel(logging.DEBUG)
         websocket.enableTrace(True)
-    
-    content, dir = scrape_webpage(args.url, FIRE_CRAWL_API_KEY)
-    
-    instructions = """Create a professional presentation with exactly 5 slides, designed for a business audience. 
-    Structure the content as follows: Slide 1 is an engaging title slide with a concise subtitle summarizing the topic without host name; 
-    Slides 2-4 are content slides with key points derived from the provided data; 
-    Slide 5 is a conclusion slide with actionable insights or a summary. 
-    Use bullet points or tables for clarity, ensuring visually appealing formats with consistent fonts and spacing. 
-    Maintain a professional and concise tone throughout, avoiding jargon unless contextually appropriate. 
-    Incorporate provided images as follows: include one relevant image per slide (Slides 1, 2, 3, 4, and 5), 
-    each sized to approximately 1/4th of the slide area, positioned to complement the text (e.g., right-aligned or top-aligned). 
-    If fewer than 5 images are provided, prioritize their placement on content slides (2-4) and use subtle placeholders or icons on remaining slides. 
-    Apply a cohesive color scheme (e.g., corporate blues or neutrals) and minimal animations to enhance professionalism. 
-    Ensure each slide is complete, self-contained, and balanced in content and design."""
 
-    image_dir = f"{dir}/images"
-    image_paths = [os.path.join(image_dir, filename) for filename in os.listdir(image_dir) 
-              if os.path.isfile(os.path.join(image_dir, filename)) 
-              and filename.lower().endswith(('.jpg', '.jpeg'))]
-    logger.debug(f"Found image paths: {image_paths}")
+    if args.command == "serve":
+        run_service(args.host, args.port, args.workers, args.queue_size)
+        sys.exit(0)
+
+    if args.command == "gc":
+        summary = collect_garbage(args.max_bytes, args.max_age_days * 24 * 3600, args.dry_run)
+        for path in summary["removed"]:
+            logger.info(f"{'Would remove' if args.dry_run else 'Removed'} {path}")
+        sys.exit(0)
     
-    shareable_link = generate_presentation(content, instructions, image_paths)
+    shareable_link = run_pipeline(
+        args.url, build_instructions(args.slides),
+        timeout=args.timeout, force=args.force, cache_ttl=args.cache_ttl,
+        crawl=args.crawl, max_pages=args.max_pages, path_prefix=args.path_prefix,
+        slide_count=args.slides, profile=args.profile
+    )
     if shareable_link:
         logger.info(f"\nPresentation available at: {shareable_link}")
     else:
-        logger.error("\nFailed to create presentation")
\ No newline at end of file
+        logger.error("\nFailed to create presentation")
@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+
+def open_breaker(name):
+    breaker = script.CircuitBreaker(name, failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    return breaker
+
+
+def serve_websocket(after_upgrade=None):
+    """Accept WebSocket upgrades and hand each connection to after_upgrade (default: stay silent)"""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(8)
+    connections = []
+
+    def handle(conn):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            request += conn.recv(4096)
+        key = next(line.split(b":", 1)[1].strip() for line in request.split(b"\r\n")
+                   if line.lower().startswith(b"sec-websocket-key"))
+        accept_key = base64.b64encode(hashlib.sha1(key + b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11").digest())
+        conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept_key + b"\r\n\r\n")
+        if after_upgrade:
+            after_upgrade(conn)
+
+    def accept():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            connections.append(conn)
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener, connections
+
+
+def drop_after_request(conn):
+    """Read the client's request frame, then drop the connection without replying"""
+    conn.recv(4096)
+    conn.close()
+
+
+class HalfOpenTrialTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (script.CIRCUIT_BREAKERS["alai"], script.WS_IDLE_TIMEOUT, script.RETRY_MAX_ATTEMPTS,
+                      script.WS_WARM_POOL_SIZE, script.RATE_LIMITS)
+        script.CANCEL_EVENT.clear()
+
+    def tearDown(self):
+        (script.CIRCUIT_BREAKERS["alai"], script.WS_IDLE_TIMEOUT, script.RETRY_MAX_ATTEMPTS,
+         script.WS_WARM_POOL_SIZE, script.RATE_LIMITS) = self.saved
+        script.RATE_LIMITERS.clear()
+        script.CANCEL_EVENT.clear()
+
+    def test_only_one_trial_is_let_through(self):
+        breaker = open_breaker("test")
+        self.assertTrue(breaker.before_call())
+        with self.assertRaises(script.CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertFalse(breaker.before_call())
+
+    def test_cancelled_request_hands_back_the_trial(self):
+        breaker = open_breaker("alai")
+        script.CIRCUIT_BREAKERS["alai"] = breaker
+
+        class CancellingLimiter:
+            def acquire(self):
+                raise script.PresentationCancelled("cancelled while waiting for a token")
+
+        original = script.get_rate_limiter
+        script.get_rate_limiter = lambda name: CancellingLimiter()
+        try:
+            with self.assertRaises(script.PresentationCancelled):
+                script.request_with_retry("GET", "http://127.0.0.1:9/", upstream="alai")
+        finally:
+            script.get_rate_limiter = original
+
+        self.assertFalse(breaker.trial_in_flight)
+        self.assertTrue(breaker.before_call())
+
+    def test_stalled_websocket_trial_reopens_the_circuit(self):
+        breaker = open_breaker("alai")
+        script.CIRCUIT_BREAKERS["alai"] = breaker
+        script.WS_IDLE_TIMEOUT = 1
+        script.RETRY_MAX_ATTEMPTS = 1
+        script.WS_WARM_POOL_SIZE = 0
+        listener, connections = serve_websocket()
+        try:
+            port = listener.getsockname()[1]
+            reason = script.run_websocket_stage(f"ws://127.0.0.1:{port}/ws", {}, "test_stage", lambda ws, msg: None)
+        finally:
+            listener.close()
+            for conn in connections:
+                conn.close()
+
+        self.assertIn("no message", reason)
+        self.assertFalse(breaker.trial_in_flight)
+        self.assertIsNotNone(breaker.opened_at)
+        time.sleep(0.06)
+        self.assertTrue(breaker.before_call())
+
+    def test_request_is_not_resent_after_the_connection_drops(self):
+        script.RETRY_MAX_ATTEMPTS = 4
+        script.WS_WARM_POOL_SIZE = 0
+        listener, connections = serve_websocket(drop_after_request)
+        try:
+            port = listener.getsockname()[1]
+            reason = script.run_websocket_stage(f"ws://127.0.0.1:{port}/ws", {"slides": 1}, "test_stage",
+                                                lambda ws, msg: None)
+        finally:
+            listener.close()
+
+        self.assertIn("after the request was sent", reason)
+        self.assertEqual(len(connections), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
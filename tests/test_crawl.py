@@ -0,0 +1,84 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+
+class CrawlPathPrefixTest(unittest.TestCase):
+    def test_directory_of_the_seed(self):
+        cases = {
+            "https://x.com": "/",
+            "https://x.com/": "/",
+            "https://x.com/docs": "/docs/",
+            "https://x.com/docs/": "/docs/",
+            "https://x.com/docs/index.html": "/docs/",
+            "https://x.com/docs/guide/intro": "/docs/guide/intro/",
+            "https://x.com/v1.2/api": "/v1.2/api/",
+        }
+        for seed, prefix in cases.items():
+            with self.subTest(seed=seed):
+                self.assertEqual(script.crawl_path_prefix(seed), prefix)
+
+
+class InCrawlScopeTest(unittest.TestCase):
+    def test_links_under_the_prefix_on_the_same_host(self):
+        seed = "https://x.com/docs/"
+        self.assertTrue(script.in_crawl_scope("https://x.com/docs/intro", seed, "/docs/"))
+        self.assertTrue(script.in_crawl_scope("http://X.com/docs/intro", seed, "/docs/"))
+        self.assertFalse(script.in_crawl_scope("https://x.com/blog/post", seed, "/docs/"))
+        self.assertFalse(script.in_crawl_scope("https://y.com/docs/intro", seed, "/docs/"))
+        self.assertFalse(script.in_crawl_scope("mailto:a@x.com", seed, "/docs/"))
+        self.assertFalse(script.in_crawl_scope("https://x.com/docs/manual.pdf", seed, "/docs/"))
+
+    def test_seed_with_default_port_matches_normalized_links(self):
+        seed = "https://x.com:443/docs/"
+        link = script.normalize_url("https://x.com/docs/intro")
+        self.assertTrue(script.in_crawl_scope(link, seed, script.crawl_path_prefix(seed)))
+
+
+class MergePageTextsTest(unittest.TestCase):
+    def test_repeated_paragraphs_are_dropped(self):
+        pages = [
+            {"text": "Menu\n\nFirst page body"},
+            {"text": "menu\n\nSecond  page body\n\nFirst page body"},
+        ]
+        self.assertEqual(script.merge_page_texts(pages, 1000), "Menu\n\nFirst page body\n\nSecond  page body")
+
+    def test_budget_is_shared_and_unused_space_carries_over(self):
+        pages = [{"text": "short"}, {"text": "a" * 100}, {"text": "b" * 100}]
+        merged = script.merge_page_texts(pages, 90)
+
+        self.assertLessEqual(len(merged), 90)
+        short, first, second = merged.split("\n\n")
+        self.assertEqual(short, "short")
+        self.assertGreater(len(first), 30)
+        self.assertGreater(len(second), 30)
+
+    def test_empty_pages_are_skipped(self):
+        self.assertEqual(script.merge_page_texts([{"text": ""}, {"text": "body"}], 100), "body")
+
+
+class PoolCrawlImagesTest(unittest.TestCase):
+    def test_images_are_picked_round_robin_without_duplicates(self):
+        pages = [
+            {"images": ["a1", "shared", "a2"]},
+            {"images": ["shared", "b1"]},
+            {"images": []},
+        ]
+        self.assertEqual(script.pool_crawl_images(pages, 10), ["a1", "shared", "a2", "b1"])
+
+    def test_limit_is_respected(self):
+        pages = [{"images": ["a1", "a2", "a3"]}, {"images": ["b1", "b2"]}]
+        self.assertEqual(script.pool_crawl_images(pages, 3), ["a1", "b1", "a2"])
+
+    def test_pages_are_not_modified(self):
+        pages = [{"images": ["a1", "a2"]}]
+        script.pool_crawl_images(pages, 1)
+        self.assertEqual(pages[0]["images"], ["a1", "a2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
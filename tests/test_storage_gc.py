@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+def make_scrape(name, size, age):
+    """Create scraped_data/<name> holding size bytes, last used age seconds ago"""
+    path = os.path.join("scraped_data", name)
+    os.makedirs(path, exist_ok=True)
+    content = os.path.join(path, "content.txt")
+    with open(content, 'w') as f:
+        f.write("x" * size)
+    used_at = time.time() - age
+    os.utime(content, (used_at, used_at))
+    os.utime(path, (used_at, used_at))
+    return path
+
+
+class CollectGarbageTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (os.getcwd(), script.IMAGE_STORE_DIR, script.LOG_FILE)
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        script.IMAGE_STORE_DIR = "image_store"
+        script.LOG_FILE = "presentation_generator.log"
+
+    def tearDown(self):
+        cwd, script.IMAGE_STORE_DIR, script.LOG_FILE = self.saved
+        os.chdir(cwd)
+        self.tmp.cleanup()
+
+    def test_expired_artifacts_are_removed(self):
+        old = make_scrape("old", 10, 40 * DAY)
+        fresh = make_scrape("fresh", 10, HOUR)
+
+        summary = script.collect_garbage(max_bytes=10 ** 9, max_age=30 * DAY)
+
+        self.assertEqual(summary["removed"], [old])
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(fresh))
+
+    def test_least_recently_used_go_first_until_under_budget(self):
+        oldest = make_scrape("oldest", 100, 3 * HOUR)
+        older = make_scrape("older", 100, 2 * HOUR)
+        newest = make_scrape("newest", 100, HOUR)
+
+        summary = script.collect_garbage(max_bytes=150, max_age=0)
+
+        self.assertEqual(summary["removed"], [oldest, older])
+        self.assertEqual(summary["remaining_bytes"], 100)
+        self.assertTrue(os.path.exists(newest))
+
+    def test_directory_in_use_is_skipped(self):
+        in_use = make_scrape("in_use", 100, 3 * HOUR)
+        idle = make_scrape("idle", 100, 2 * HOUR)
+        with script.artifact_in_use(in_use):
+            used_at = time.time() - 3 * HOUR
+            os.utime(os.path.join(in_use, ".inuse"), (used_at, used_at))
+            summary = script.collect_garbage(max_bytes=150, max_age=0)
+
+        self.assertEqual(summary["removed"], [idle])
+        self.assertTrue(os.path.exists(in_use))
+
+    def test_dry_run_removes_nothing(self):
+        old = make_scrape("old", 100, 40 * DAY)
+
+        summary = script.collect_garbage(max_bytes=10 ** 9, max_age=30 * DAY, dry_run=True)
+
+        self.assertTrue(summary["dry_run"])
+        self.assertEqual(summary["removed"], [old])
+        self.assertEqual(summary["freed_bytes"], 100)
+        self.assertTrue(os.path.exists(os.path.join(old, "content.txt")))
+
+    def test_hard_linked_images_are_counted_once(self):
+        os.makedirs("image_store")
+        stored = os.path.join("image_store", "logo.jpg")
+        with open(stored, 'wb') as f:
+            f.write(b"\0" * 900)
+        for name in ("a", "b"):
+            os.makedirs(os.path.join(make_scrape(name, 0, DAY), "images"))
+            os.link(stored, os.path.join("scraped_data", name, "images", "img0.jpg"))
+
+        artifacts = script.list_artifacts()
+
+        self.assertEqual(sum(artifact["size"] for artifact in artifacts), 900)
+
+    def test_touching_a_shared_image_does_not_refresh_linked_scrapes(self):
+        os.makedirs("image_store")
+        stored = os.path.join("image_store", "logo.jpg")
+        with open(stored, 'wb') as f:
+            f.write(b"\0" * 10)
+        old = make_scrape("old", 10, 40 * DAY)
+        os.makedirs(os.path.join(old, "images"))
+        os.link(stored, os.path.join(old, "images", "img0.jpg"))
+        used_at = time.time() - 40 * DAY
+        os.utime(os.path.join(old, "images"), (used_at, used_at))
+        os.utime(old, (used_at, used_at))
+        os.utime(stored)
+
+        summary = script.collect_garbage(max_bytes=10 ** 9, max_age=30 * DAY)
+
+        self.assertEqual(summary["removed"], [old])
+
+
+if __name__ == "__main__":
+    unittest.main()